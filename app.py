@@ -1,18 +1,42 @@
-from flask import Flask, request, jsonify, send_from_directory, redirect, url_for
+from flask import Flask, Response, request, jsonify, send_from_directory, redirect, url_for, g, stream_with_context
 import os
-import subprocess
+import time
+import json
+import logging
+import multiprocessing
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import study_recommender  # Import your recommendation system
-from summarizer import summarize_transcription
+from summarizer import ChunkPrefetcher, summarize_transcription
 import cleanup
+import transcribe
+import model_registry
+import jobs
+import workspace
+from result_cache import result_cache
+import streaming_upload
+from streaming_upload import UploadError
+import metrics
+import tracing
 
 load_dotenv()
+tracing.configure_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_folder='.', static_url_path='')
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['ALLOWED_EXTENSIONS'] = {'txt', 'pdf', 'docx', 'mp3', 'mp4', 'wav'}
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
+# Per-request cap; bigger files go through the resumable /uploads protocol in chunks
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_REQUEST_SIZE', str(512 * 1024 * 1024)))
+
+# External search results go stale, unlike transcriptions and summaries
+RECOMMENDATION_CACHE_TTL = int(os.getenv('RECOMMENDATION_CACHE_TTL', str(24 * 3600)))
+JOBS_DIR = '.jobs'
+# An event stream holds its worker, so each one ends well inside gunicorn's
+# default 30s --timeout and EventSource reconnects, resuming from Last-Event-ID.
+# Sync workers still serve nothing else meanwhile: prefer --worker-class gthread.
+SSE_MAX_SECONDS = float(os.getenv('SSE_MAX_SECONDS', '20'))
+SSE_RETRY_MS = 500
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
@@ -21,119 +45,504 @@ def allowed_file(filename):
 
 def process_file(filepath):
     try:
-        if os.path.exists('./main.exe'):
-            result = subprocess.run(
-                ['./main.exe', filepath],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return result.stdout
-        else:
-            result = subprocess.run(
-                ['python', 'transcribe.py', filepath],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"Error processing file: {e.stderr}")
+        return transcribe.extract_text(filepath)
+    except Exception as e:
+        logger.error(f"Error processing file: {e}")
+        return None
+
+def job_workspace(job):
+    """Each job's upload lives in its own content-addressed workspace"""
+    return os.path.dirname(job.filepath)
+
+def job_content_hash(job):
+    """Workspaces are named after the SHA-256 of the uploaded bytes"""
+    return workspace.workspace_key(job_workspace(job))
+
+def extraction_params(filepath):
+    # Only audio/video output depends on which Whisper model decoded it
+    if os.path.splitext(filepath)[1].lower() in ('.pdf', '.docx', '.txt'):
+        return {}
+    return {'whisper': model_registry.WHISPER_MODEL}
+
+def run_extract(job):
+    params = extraction_params(job.filepath)
+    output = result_cache.get('extract', job_content_hash(job), **params)
+    if output:
+        job.stages['extract']['cached'] = True
+    else:
+        # Chunks that are already complete get summarized while extraction continues
+        prefetcher = ChunkPrefetcher()
+        try:
+            if transcribe.streams_segments(job.filepath):
+                # Publish segments as they are decoded so progress and partial
+                # text are visible before the whole recording is transcribed
+                segments = job.results.setdefault('segments', [])
+                with tracing.span('transcribe', mode='chunked') as fields:
+                    for start, end, text in transcribe.transcribe_segments(job.filepath):
+                        segments.append({'start': round(start, 2), 'end': round(end, 2), 'text': text})
+                        job.notify()
+                        if text:
+                            prefetcher.feed(text, " ")
+                    fields['segments'] = len(segments)
+                output = " ".join(segment['text'] for segment in segments if segment['text'])
+            elif os.path.splitext(job.filepath)[1].lower() == '.pdf':
+                # Pages arrive in order; count them so progress is visible
+                pages = []
+                for text in transcribe.stream_text(job.filepath):
+                    pages.append(text)
+                    job.stages['extract']['pages'] = len(pages)
+                    job.notify()
+                    prefetcher.feed(text, "\n")
+                output = "\n".join(pages).strip()
+            else:
+                output = process_file(job.filepath)
+        finally:
+            prefetcher.close()
+            # Charged against the summarize stage's map budget
+            job.stages['extract']['prefetched'] = prefetcher.spent()
+        if not output:
+            raise Exception('File processing failed')
+        result_cache.put('extract', job_content_hash(job), output, **params)
+
+    transcription_path = os.path.join(job_workspace(job), 'transcription.txt')
+    workspace.write_atomic(transcription_path, output)
+    job.results['content'] = output
+
+def run_summarize(job):
+    job.results['summary'] = summarize_transcription(job_workspace(job), job_content_hash(job),
+                                                     spent=tuple(job.stages['extract'].get('prefetched', (0, 0.0))))
+
+def run_recommend(job):
+    cached = result_cache.get('recommend', job_content_hash(job), max_age=RECOMMENDATION_CACHE_TTL)
+    if cached:
+        job.stages['recommend']['cached'] = True
+        job.results['recommendations'] = cached
+        return
+
+    # Publish each category as it is ready for the streaming results page
+    partial = job.results['recommendations'] = {}
+
+    def publish(category, items):
+        partial[category] = items
+        job.notify()
+
+    recommendations = study_recommender.generate_recommendations(job.results['content'], on_category=publish)
+    if any(recommendations.values()):
+        result_cache.put('recommend', job_content_hash(job), recommendations)
+    job.results['recommendations'] = recommendations
+
+PIPELINE_STAGES = [
+    ('extract', run_extract),
+    ('summarize', run_summarize),
+    ('recommend', run_recommend)
+]
+
+def stage_slot(name, job):
+    """Only audio/video extraction counts against STAGE_LIMIT_EXTRACT"""
+    if name == 'extract' and os.path.splitext(job.filepath)[1].lower() in transcribe.DOCUMENT_EXTENSIONS:
         return None
+    return name
+
+job_queue = None
+resumable_uploads = None
+
+def _queue_depths():
+    return [({'stage': name}, depth) for name, depth in job_queue.queue_depth().items()]
+
+def _cache_hit_ratios():
+    ratios = [({'cache': 'result', 'stage': stage}, c['hit_ratio'])
+              for stage, c in result_cache.stats()['stages'].items()]
+    ratios += [({'cache': 'search', 'stage': source}, c['hit_ratio'])
+               for source, c in study_recommender.search_cache.stats()['sources'].items()]
+    return ratios
+
+def create_app():
+    """Start the job queue, upload sweeper and metrics for this server process.
+
+    Kept out of plain imports: transcription process pools use spawn, which
+    re-imports the main module in every child.
+    """
+    global job_queue, resumable_uploads
+    if job_queue is not None:
+        return app
+
+    # Load PRELOAD_MODELS (e.g. "bart,keybert") at startup so that
+    # `gunicorn --preload` shares the weights with every forked worker
+    model_registry.preload()
+
+    job_queue = jobs.JobQueue(
+        PIPELINE_STAGES,
+        limits=jobs.stage_limits_from_env([name for name, _ in PIPELINE_STAGES]),
+        slot=stage_slot,
+        # Shared with the other gunicorn workers, which may get this job's requests
+        store=jobs.JobStore(os.path.join(app.config['UPLOAD_FOLDER'], JOBS_DIR))
+    )
+    resumable_uploads = streaming_upload.ResumableUploads(app.config['UPLOAD_FOLDER'])
+    cleanup.start_sweeper(
+        app.config['UPLOAD_FOLDER'],
+        keep=lambda: {workspace.workspace_key(job_workspace(job)) for job in job_queue.active()},
+        on_sweep=lambda: job_queue.evict(workspace.WORKSPACE_TTL)
+    )
+
+    metrics.registry.callback('lectura_queue_depth', 'Jobs waiting on or running each stage', _queue_depths)
+    metrics.registry.callback('lectura_cache_hit_ratio', 'Hit ratio of the result and search caches', _cache_hit_ratios)
+    metrics.registry.callback('lectura_process_rss_bytes', 'Resident memory of this worker',
+                              lambda: [({}, model_registry.model_stats()['process_rss_bytes'])])
+    return app
+
+# `gunicorn app:app` and `python app.py` get a ready app; spawned pool children don't
+if multiprocessing.parent_process() is None:
+    create_app()
+
+@app.before_request
+def start_request_trace():
+    g.trace_token = tracing.start_trace(request.headers.get('X-Request-ID'))
+    g.request_started = time.perf_counter()
+    g.profiler = tracing.start_profiler()
+    metrics.HTTP_INFLIGHT.inc()
+
+@app.after_request
+def finish_request_trace(response):
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unknown'
+    metrics.HTTP_SECONDS.observe(elapsed, endpoint=endpoint, status=response.status_code)
+    tracing.stop_profiler(g.pop('profiler', None), f'http-{endpoint}', elapsed)
+    response.headers['X-Request-ID'] = tracing.current_trace()
+    if endpoint != 'prometheus_metrics':
+        logger.info(f"{request.method} {request.path} {response.status_code} in {elapsed:.3f}s", extra={
+            'method': request.method, 'endpoint': endpoint,
+            'status': response.status_code, 'seconds': round(elapsed, 4)
+        })
+    return response
+
+@app.teardown_request
+def end_request_trace(exc):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()  # The request failed before after_request could
+    if 'trace_token' in g:
+        metrics.HTTP_INFLIGHT.dec()
+        tracing.end_trace(g.pop('trace_token'))
 
 @app.route('/')
 def home():
     return send_from_directory('.', 'index.html')
 
+def queue_upload(filepath):
+    job = job_queue.submit(filepath)
+    return jsonify({
+        'success': True,
+        'message': 'File queued for processing',
+        'job_id': job.id,
+        'workspace': workspace.workspace_key(job_workspace(job)),
+        'status_url': f'/jobs/{job.id}',
+        'redirect': f'/recommendations?job={job.id}'
+    }), 202
+
+@app.errorhandler(UploadError)
+def upload_error(e):
+    return jsonify({'error': str(e)}), e.status
+
+def upload_target(original_name):
+    """Incoming path for an upload named original_name, if that file type is allowed"""
+    if original_name == '':
+        raise UploadError('No selected file')
+    if not allowed_file(original_name):
+        raise UploadError('File type not allowed')
+    return workspace.incoming_path(app.config['UPLOAD_FOLDER'], secure_filename(original_name))
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
-    
-    if not allowed_file(file.filename):
-        return jsonify({'error': 'File type not allowed'}), 400
-    
+    """Single-request upload: multipart form field "file", or the raw body
+    with ?filename=... (both streamed straight to disk)"""
     try:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        output = process_file(filepath)
-        if not output:
-            return jsonify({'error': 'File processing failed'}), 500
-        
-        transcription_path = os.path.join(app.config['UPLOAD_FOLDER'], 'transcription.txt')
-        with open(transcription_path, 'w', encoding='utf-8') as f:
-            f.write(output)
-            
-        return jsonify({
-            'success': True,
-            'message': 'File processed successfully',
-            'redirect': '/recommendations'
-        })
+        # Hash while writing so the file is never read back just to name its workspace
+        with tracing.span('save') as fields:
+            if request.mimetype == 'multipart/form-data':
+                boundary = request.mimetype_params.get('boundary')
+                if not boundary:
+                    raise UploadError('No file part')
+                original_name, temp_path, fields['bytes'], sha256 = streaming_upload.save_multipart(
+                    request.stream, boundary, upload_target)
+            else:
+                original_name = request.args.get('filename', '')
+                temp_path = upload_target(original_name)
+                fields['bytes'], sha256 = streaming_upload.save_stream(request.stream, temp_path)
+        filepath = workspace.adopt_upload(app.config['UPLOAD_FOLDER'], temp_path,
+                                          secure_filename(original_name), sha256)
+        return queue_upload(filepath)
+    except UploadError:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable upload: JSON {filename, size, sha256 (optional)}.
+
+    When the sha256 matches content uploaded before, the response carries a
+    challenge of [offset, length] byte ranges. POSTing exactly those bytes
+    to /uploads/<id>/proof starts the job without transferring the file.
+    """
+    data = request.get_json(silent=True) or {}
+    original_name = data.get('filename', '')
+    if not original_name or not allowed_file(original_name):
+        return jsonify({'error': 'File type not allowed'}), 400
+    filename = secure_filename(original_name)
+
+    try:
+        size = int(data['size'])
+    except (KeyError, TypeError, ValueError):
+        size = -1
+    if size < 0:
+        return jsonify({'error': 'Invalid size'}), 400
+
+    existing = None
+    if data.get('sha256'):
+        existing = streaming_upload.find_existing(app.config['UPLOAD_FOLDER'], str(data['sha256']).lower(), filename)
+    return jsonify(resumable_uploads.create(filename, size, data.get('sha256'), existing)), 201
+
+@app.route('/uploads/<upload_id>/proof', methods=['POST'])
+def upload_proof(upload_id):
+    """Answer a dedupe challenge; on a mismatch the client uploads as usual"""
+    existing = resumable_uploads.prove(upload_id, request.stream)
+    if existing is None:
+        return jsonify(dict(resumable_uploads.status(upload_id), verified=False))
+    return queue_upload(existing)
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    return jsonify(resumable_uploads.status(upload_id))
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Append the request body at ?offset=...; the last chunk starts the job"""
+    try:
+        offset = int(request.args.get('offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Invalid offset'}), 400
+
+    with tracing.span('save', upload=upload_id):
+        status = resumable_uploads.append(upload_id, offset, request.stream)
+    if not status['complete']:
+        return jsonify(status)
+
+    part_path, filename, sha256 = resumable_uploads.finish(upload_id)
+    filepath = workspace.adopt_upload(app.config['UPLOAD_FOLDER'], part_path, filename, sha256)
+    return queue_upload(filepath)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == 'failed':
+        return jsonify({'error': job.error}), 500
+    if job.status != 'done':
+        return jsonify(job.to_dict()), 202
+    return jsonify(job.results)
+
+@app.route('/models')
+def models():
+    return jsonify(model_registry.model_stats())
+
+@app.route('/cache')
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return metrics.registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/download-summary')
 def download_summary():
-    summary_path = os.path.join(app.config['UPLOAD_FOLDER'], 'summary.txt')
-    if not os.path.exists(summary_path):
+    path = workspace.get_workspace(app.config['UPLOAD_FOLDER'], request.args.get('workspace', ''))
+    if path is None or not os.path.exists(os.path.join(path, 'summary.txt')):
         return "Summary not found", 404
     return send_from_directory(
-        app.config['UPLOAD_FOLDER'],
+        path,
         'summary.txt',
         as_attachment=True,
         download_name='lectura_summary.txt'
     )
 
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent events with each piece of the results page as it is ready"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return Response(
+        stream_with_context(job_event_stream(job, last_event_id=request.headers.get('Last-Event-ID'))),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def sse(event, data, event_id=None):
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return message if event_id is None else f"id: {event_id}\n{message}"
+
+def job_event_stream(job, keepalive=15, max_seconds=SSE_MAX_SECONDS, last_event_id=None):
+    """Yield stage, preview, summary and category events until the job ends.
+
+    Every event carries the job version it reflects as its id. The stream
+    closes after max_seconds; a client reconnecting with the current
+    version as Last-Event-ID only gets what changed after it, any other
+    client gets the whole page again (each event replaces its piece).
+    """
+    deadline = time.monotonic() + max_seconds
+    sent = {}
+
+    def changed(key, value):
+        if sent.get(key) == value:
+            return False
+        sent[key] = value
+        return True
+
+    def updates(version):
+        for name, stage in job.stages.items():
+            if changed(('stage', name), stage['status']):
+                yield sse('stage', {'name': name, 'status': stage['status'], 'progress': job.progress}, version)
+
+        content = job.results.get('content')
+        if content is None:
+            content = " ".join(segment['text'] for segment in job.results.get('segments', []) if segment['text'])
+        if content and changed('preview', format_preview(content)):
+            yield sse('preview', {'html': sent['preview']}, version)
+
+        if 'summary' in job.results and changed('summary', format_summary(job.results['summary'])):
+            yield sse('summary', {'html': sent['summary']}, version)
+
+        for category, items in list(job.results.get('recommendations', {}).items()):
+            if changed(('category', category), [item['url'] for item in items[:7]]):
+                yield sse('category', {'category': category, 'html': format_category(category, items)}, version)
+
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+    while True:
+        version = job.version
+        # Read before the results: everything a finished job produced is visible by now
+        finished = job.finished is not None
+
+        for message in updates(version):
+            # A client resuming at this version already has it all
+            if str(version) != last_event_id:
+                yield message
+        last_event_id = None
+
+        if finished:
+            if job.status == 'failed':
+                yield sse('failed', {'error': job.error}, version)
+            else:
+                yield sse('done', {'download_url': download_url(job)}, version)
+            return
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return  # EventSource reconnects after SSE_RETRY_MS
+        if not job.wait_for_change(version, timeout=min(keepalive, remaining)):
+            yield ": keepalive\n\n"
+
 @app.route('/recommendations')
 def recommendations():
-    transcription_path = os.path.join(app.config['UPLOAD_FOLDER'], 'transcription.txt')
-    
-    if not os.path.exists(transcription_path):
+    job = job_queue.get(request.args.get('job', ''))
+    if job is None:
         return redirect('/')
-    
-    with open(transcription_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    summary = summarize_transcription(app.config['UPLOAD_FOLDER'])
-    recommendations = study_recommender.generate_recommendations(content)
-    
-    # Format content displays
-    formatted_content = content[:500].replace('\n', '<br>') + ('...' if len(content) > 500 else '')
-    formatted_summary = (summary.replace('\n', '<br>') if summary else "No summary available")
-    
-    # Create categorized recommendations HTML
-    def format_category(category, items, emoji):
-        if not items:
-            return ""
-        items_html = "<br>".join(
-            [f'{emoji} <a href="{item["url"]}" target="_blank" class="{category}-link">{item["title"]}</a>'
-             for item in items[:7]]  # Show max 7 per category
+
+    if job.status == 'failed':
+        return f"Processing failed: {job.error}", 500
+    if job.status != 'done':
+        # Page shell now; the pieces arrive over /jobs/<id>/events
+        return render_results_page(
+            '<span class="placeholder">Extracting content...</span>',
+            '<span class="placeholder">Waiting for content...</span>',
+            {category: '' for category in CATEGORY_ICONS},
+            download_url(job),
+            events_url=f'/jobs/{job.id}/events'
         )
-        return f"""
-        <div class="recommend-category {category}-category">
-            <h3>{category.replace('_', ' ').title()}:</h3>
-            <div class="category-items">{items_html}</div>
-        </div>
-        """
-    
-    youtube_html = format_category('youtube', recommendations['youtube'], '🎥')
-    wikipedia_html = format_category('wikipedia', recommendations['wikipedia'], '📚')
-    khan_html = format_category('khan_academy', recommendations['khan_academy'], '🏫')
-    
-    recommendations_html = f"""
-    <div class="recommendations-container">
-        {youtube_html}
-        {wikipedia_html}
-        {khan_html}
+
+    workspace.touch(job_workspace(job))
+    return render_recommendations(
+        job.results['content'],
+        job.results['summary'],
+        job.results['recommendations'],
+        workspace.workspace_key(job_workspace(job))
+    )
+
+def download_url(job):
+    return f"/download-summary?workspace={workspace.workspace_key(job_workspace(job))}"
+
+CATEGORY_ICONS = {'youtube': '🎥', 'wikipedia': '📚', 'khan_academy': '🏫'}
+
+def format_preview(content):
+    return content[:500].replace('\n', '<br>') + ('...' if len(content) > 500 else '')
+
+def format_summary(summary):
+    return summary.replace('\n', '<br>') if summary else "No summary available"
+
+def format_category(category, items):
+    if not items:
+        return ""
+    items_html = "<br>".join(
+        [f'{CATEGORY_ICONS[category]} <a href="{item["url"]}" target="_blank" class="{category}-link">{item["title"]}</a>'
+         for item in items[:7]]  # Show max 7 per category
+    )
+    return f"""
+    <div class="recommend-category {category}-category">
+        <h3>{category.replace('_', ' ').title()}:</h3>
+        <div class="category-items">{items_html}</div>
     </div>
     """
-    
+
+def render_recommendations(content, summary, recommendations, workspace_key):
+    return render_results_page(
+        format_preview(content),
+        format_summary(summary),
+        {category: format_category(category, recommendations.get(category, [])) for category in CATEGORY_ICONS},
+        f"/download-summary?workspace={workspace_key}"
+    )
+
+# Fills the page in from the job's event stream
+STREAM_SCRIPT = """
+    <script>
+        const events = new EventSource(%s);
+        const set = (id, html) => { document.getElementById(id).innerHTML = html; };
+        events.addEventListener('stage', e => {
+            const stage = JSON.parse(e.data);
+            document.getElementById('progress').textContent =
+                `${stage.name}: ${stage.status} (${Math.round(stage.progress * 100)}%%)`;
+        });
+        events.addEventListener('preview', e => set('preview', JSON.parse(e.data).html));
+        events.addEventListener('summary', e => set('summary', JSON.parse(e.data).html));
+        events.addEventListener('category', e => {
+            const data = JSON.parse(e.data);
+            set(`${data.category}-slot`, data.html);
+        });
+        events.addEventListener('done', () => {
+            events.close();
+            document.getElementById('progress').remove();
+            document.querySelector('.download-btn').hidden = false;
+        });
+        events.addEventListener('failed', e => {
+            events.close();
+            document.getElementById('progress').textContent = 'Processing failed: ' + JSON.parse(e.data).error;
+        });
+    </script>
+"""
+
+def render_results_page(preview_html, summary_html, categories_html, download_href, events_url=None):
+    recommendations_html = "".join(
+        f'<div id="{category}-slot">{category_html}</div>' for category, category_html in categories_html.items()
+    )
+    progress_html = '<p id="progress" class="progress">Processing...</p>' if events_url else ''
+    script_html = STREAM_SCRIPT % json.dumps(events_url) if events_url else ''
+
     return f"""
     <!DOCTYPE html>
     <html>
@@ -144,31 +553,28 @@ def recommendations():
     <body>
         <div class="container results">
             <h1>Study Recommendations</h1>
+            {progress_html}
             <div class="results-container">
                 <div class="transcription-preview">
                     <h3>Processed Content Preview:</h3>
-                    <div class="content-box">{formatted_content}</div>
+                    <div class="content-box" id="preview">{preview_html}</div>
                 </div>
                 <div class="summary">
                     <h3>Content Summary:</h3>
-                    <div class="content-box">{formatted_summary}</div>
+                    <div class="content-box" id="summary">{summary_html}</div>
                 </div>
                 <div class="recommendations">
                     <h3>Recommended Study Materials:</h3>
-                    {recommendations_html}
+                    <div class="recommendations-container">{recommendations_html}</div>
                 </div>
             </div>
             <a href="/" class="back-btn">Process Another File</a>
-            <a href="/download-summary" class="download-btn">Download Summary</a>
+            <a href="{download_href}" class="download-btn"{' hidden' if events_url else ''}>Download Summary</a>
         </div>
+        {script_html}
     </body>
     </html>
     """
 
 if __name__ == '__main__':
-    if not os.path.exists('main.exe'):
-        try:
-            subprocess.run(['g++', 'main.cpp', '-o', 'main.exe'], check=True)
-        except subprocess.CalledProcessError:
-            print("C++ compilation failed, using Python fallback")
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,418 @@
+# benchmark.py
+"""End-to-end benchmark of the upload -> summarize -> recommend pipeline.
+
+Runs process_file, ContentSummarizer.summarize_text, extract_keywords and
+generate_recommendations over the sample inputs and synthetic documents of
+several sizes. YouTube and Wikipedia are replaced by a local stub server.
+Results (latency percentiles, throughput, model load time, peak RSS) are
+written as JSON; pass --baseline with an earlier run to flag regressions.
+--compare-backends instead measures the summarizer and keyword models on
+each inference backend against the first one listed.
+
+    python benchmark.py --sizes 500,2000,8000 --repeats 3 --output bench.json
+    python benchmark.py --compare-backends pytorch,quantized,onnx --output backends.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_FILES = ['input1.txt', 'input2.txt']
+STAGES = ['extract', 'summarize', 'keywords', 'recommend']
+# Long enough to pass the summarizer's 80-word minimum
+WARMUP_TEXT = ' '.join(['The lecture warms up the models before anything is timed.'] * 12)
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    """Answers YouTube and MediaWiki search requests with canned results"""
+    latency = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        time.sleep(self.latency)
+        if url.path == '/youtube':
+            query = params.get('q', [''])[0]
+            body = {'items': [{
+                'id': {'videoId': f"{abs(hash(query)) % 10 ** 8}-{i}"},
+                'snippet': {'title': f"{query} part {i}", 'description': f"Lecture {i} on {query}"}
+            } for i in range(int(params.get('maxResults', ['7'])[0]))]}
+        elif url.path == '/wikipedia':
+            query = params.get('srsearch', [''])[0]
+            body = {'query': {'search': [{
+                'title': f"{query} {i}", 'snippet': f"<span>{query}</span> article {i}"
+            } for i in range(int(params.get('srlimit', ['7'])[0]))]}}
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(latency: float) -> ThreadingHTTPServer:
+    StubSearchHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubSearchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def build_corpus(sizes: List[int], directory: str, seed: int = 0) -> List[Tuple[str, str]]:
+    """(name, path) of the sample inputs plus synthetic documents of each size.
+
+    Synthetic documents are shuffled paragraphs of the samples, so they read
+    like lecture notes but have a predictable word count.
+    """
+    corpus = []
+    paragraphs = []
+    for name in SAMPLE_FILES:
+        path = os.path.join(BASE_DIR, name)
+        if os.path.exists(path):
+            corpus.append((name, path))
+            with open(path, 'r', encoding='utf-8') as f:
+                paragraphs.extend(p.strip() for p in f.read().split('\n\n') if p.strip())
+    if not paragraphs:
+        paragraphs = ["Lectures introduce a topic, explain its key ideas and work through examples."]
+
+    rng = random.Random(seed)
+    for size in sizes:
+        words, parts = 0, []
+        while words < size:
+            paragraph = rng.choice(paragraphs)
+            parts.append(paragraph)
+            words += len(paragraph.split())
+        path = os.path.join(directory, f'synthetic_{size}.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(parts))
+        corpus.append((f'synthetic_{size}', path))
+    return corpus
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def summarize_timings(samples: List[float], words: int) -> Dict[str, float]:
+    ordered = np.asarray(samples)
+    return {
+        'runs': len(samples),
+        'mean': round(float(ordered.mean()), 4),
+        'p50': round(float(np.percentile(ordered, 50)), 4),
+        'p90': round(float(np.percentile(ordered, 90)), 4),
+        'p99': round(float(np.percentile(ordered, 99)), 4),
+        'max': round(float(ordered.max()), 4),
+        'words_per_second': round(words / float(ordered.mean()), 1) if ordered.mean() > 0 else 0.0
+    }
+
+def measure(func: Callable[[], Any], repeats: int, reset: Optional[Callable[[], None]] = None) -> Tuple[List[float], Any]:
+    samples, result = [], None
+    for _ in range(repeats):
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+def load_models(names: List[str]) -> Dict[str, float]:
+    """Seconds taken to load each model (0 if it was already loaded)"""
+    import model_registry
+    times = {}
+    for name in names:
+        start = time.perf_counter()
+        model_registry.get_model(name)
+        times[name] = round(time.perf_counter() - start, 3)
+        print(f"📦 Loaded {name} in {times[name]}s")
+    return times
+
+def run(args) -> Dict[str, Any]:
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    server = start_stub_server(args.stub_latency)
+    host, port = server.server_address
+    os.environ.setdefault('YOUTUBE_API_KEY', 'benchmark')
+
+    import model_registry
+    import study_recommender
+    import vector_index
+    from summarizer import ContentSummarizer
+    from result_cache import ResultCache
+    study_recommender.YOUTUBE_API_KEY = study_recommender.YOUTUBE_API_KEY or 'benchmark'
+    study_recommender.YOUTUBE_API_URL = f'http://{host}:{port}/youtube'
+    study_recommender.WIKIPEDIA_API_URL = f'http://{host}:{port}/wikipedia'
+
+    needed = []
+    if 'summarize' in stages:
+        needed.append('bart')
+    if {'keywords', 'recommend'} & set(stages):
+        needed.append('keybert')
+    model_load = load_models(needed)
+    if 'keybert' in needed:
+        # Pay for lazy imports (scikit-learn) outside the timed runs
+        study_recommender.keyword_engine.extract(WARMUP_TEXT)
+    summarizer = ContentSummarizer() if 'summarize' in stages else None
+
+    with tempfile.TemporaryDirectory(prefix='lectura-bench-') as temp_dir:
+        if summarizer is not None:
+            # Never read or fill the production ./cache; only --warm reuses chunk summaries
+            summarizer.cache_chunks = args.warm
+            summarizer.chunk_cache = ResultCache(os.path.join(temp_dir, 'chunk-cache'))
+
+        def isolate_caches():
+            # Stub search results must never reach the production search cache
+            # or vector index, where real users would be served them
+            study_recommender.search_cache = study_recommender.SearchCache(db_path='')
+            study_recommender.recommendation_index = vector_index.VectorIndex(
+                os.path.join(temp_dir, f'index-{time.monotonic_ns()}'))
+
+        def reset_caches():
+            # Cold runs: no embedding, search or vector index hits carried over
+            if args.warm:
+                return
+            study_recommender.keyword_engine = study_recommender.KeywordEngine()
+            isolate_caches()
+
+        isolate_caches()
+        corpus = build_corpus(args.sizes, temp_dir, args.seed)
+        corpus.extend((os.path.basename(path), path) for path in args.files)
+        if 'extract' in stages:
+            # Not app.process_file: importing app starts the job queue and sweeper
+            import transcribe
+
+        results: Dict[str, Dict[str, Any]] = {stage: {} for stage in stages}
+        for name, path in corpus:
+            print(f"\n📄 {name}")
+            text = None
+            if 'extract' in stages:
+                try:
+                    samples, text = measure(lambda: transcribe.extract_text(path), args.repeats)
+                except Exception as e:
+                    print(f"   ❌ extract failed: {e}")
+                    results['extract'][name] = {'error': str(e)}
+                    continue
+                results['extract'][name] = summarize_timings(samples, len((text or '').split()))
+            if text is None:
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    text = f.read()
+            words = len(text.split())
+
+            if 'summarize' in stages:
+                samples, _ = measure(lambda: summarizer.summarize_text(text), args.repeats)
+                results['summarize'][name] = dict(summarize_timings(samples, words), **{
+                    k: v for k, v in summarizer.last_stats.items() if isinstance(v, (int, float))
+                })
+            if 'keywords' in stages:
+                samples, _ = measure(lambda: study_recommender.extract_keywords(text), args.repeats, reset_caches)
+                results['keywords'][name] = summarize_timings(samples, words)
+            if 'recommend' in stages:
+                samples, _ = measure(lambda: study_recommender.generate_recommendations(text), args.repeats, reset_caches)
+                results['recommend'][name] = summarize_timings(samples, words)
+
+            for stage in stages:
+                if name in results[stage] and 'p50' in results[stage][name]:
+                    print(f"   {stage:<10} p50 {results[stage][name]['p50']:.3f}s  "
+                          f"p90 {results[stage][name]['p90']:.3f}s  "
+                          f"{results[stage][name]['words_per_second']} words/s")
+
+    server.shutdown()
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'sizes': args.sizes,
+            'repeats': args.repeats,
+            'warm': args.warm,
+            'stub_latency': args.stub_latency,
+            'env': {k: v for k, v in os.environ.items() if k in (
+                'SUMMARIZER_MODEL', 'WHISPER_MODEL', 'SUMMARY_MODE', 'SUMMARIZER_BATCH_SIZE',
+                'TRANSCRIBE_MODE', 'KEYWORD_CANDIDATES', 'EMBED_BATCH_SIZE'
+            )}
+        },
+        'model_load_seconds': model_load,
+        'models': model_registry.model_stats(),
+        'search': study_recommender.search_stats(),
+        'peak_rss_bytes': peak_rss(),
+        'stages': results
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Stage/input pairs whose p50 grew by more than tolerance over the baseline"""
+    regressions = []
+    for stage, inputs in current['stages'].items():
+        for name, timings in inputs.items():
+            before = baseline.get('stages', {}).get(stage, {}).get(name)
+            if not before or not before.get('p50'):
+                continue
+            if 'error' in timings:
+                print(f"❌ {stage}/{name}: failed ({timings['error']})")
+                regressions.append(f'{stage}/{name}')
+                continue
+            change = timings['p50'] / before['p50'] - 1
+            marker = '❌' if change > tolerance else '✅'
+            print(f"{marker} {stage}/{name}: p50 {before['p50']:.3f}s -> {timings['p50']:.3f}s ({change:+.0%})")
+            if change > tolerance:
+                regressions.append(f'{stage}/{name}')
+    return regressions
+
+def _words(text: Optional[str]) -> List[str]:
+    return re.findall(r"[\w']+", (text or '').lower())
+
+def rouge_scores(candidate: Optional[str], reference: Optional[str]) -> Dict[str, float]:
+    """ROUGE-1 and ROUGE-L F1 of candidate against reference"""
+    cand, ref = _words(candidate), _words(reference)
+    if not cand or not ref:
+        return {'rouge1': 0.0, 'rougeL': 0.0}
+
+    def f1(overlap):
+        if not overlap:
+            return 0.0
+        precision, recall = overlap / len(cand), overlap / len(ref)
+        return round(2 * precision * recall / (precision + recall), 4)
+
+    overlap = sum((Counter(cand) & Counter(ref)).values())
+    # Longest common subsequence, one row at a time
+    previous = [0] * (len(ref) + 1)
+    for word in cand:
+        current = [0]
+        for j, ref_word in enumerate(ref):
+            current.append(previous[j] + 1 if word == ref_word else max(previous[j + 1], current[j]))
+        previous = current
+    return {'rouge1': f1(overlap), 'rougeL': f1(previous[-1])}
+
+def compare_backends(backends: List[str], corpus: List[Tuple[str, str]], repeats: int) -> Dict[str, Any]:
+    """Latency and agreement of each inference backend with the first one.
+
+    Summaries are scored with ROUGE against the reference backend's, and
+    keywords by overlap with its keywords plus the cosine similarity of the
+    chunk embeddings both backends produce.
+    """
+    import model_registry
+    import study_recommender
+    from summarizer import ContentSummarizer
+
+    texts = {}
+    for name, path in corpus:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            texts[name] = f.read()
+
+    reference: Dict[str, Dict[str, Any]] = {}
+    report: Dict[str, Any] = {}
+    for backend in backends:
+        print(f"\n⚙️ Backend: {backend}")
+        start = time.perf_counter()
+        summarizer = ContentSummarizer(pipeline=model_registry.load_summarizer(backend=backend))
+        summarizer_load = time.perf_counter() - start
+        start = time.perf_counter()
+        engine = study_recommender.KeywordEngine(embedder=model_registry.load_keyword_model(backend=backend).model)
+        keyword_load = time.perf_counter() - start
+        summarizer.summarize_text(WARMUP_TEXT)
+        engine.extract(WARMUP_TEXT)
+
+        inputs = {}
+        for name, text in texts.items():
+            summary_times, summary = measure(lambda: summarizer.summarize_text(text), repeats)
+            keyword_times, keywords = measure(lambda: [k for k, _ in engine.extract(text)], repeats)
+            chunks = engine.chunk(text)
+            vectors = engine.embed(chunks) if chunks else None
+
+            entry = {
+                'summary_seconds': round(float(np.mean(summary_times)), 4),
+                'keyword_seconds': round(float(np.mean(keyword_times)), 4),
+                'summary_words': len(_words(summary)),
+                'keywords': keywords
+            }
+            if backend == backends[0]:
+                reference[name] = {'summary': summary, 'keywords': keywords, 'vectors': vectors}
+            else:
+                ref = reference[name]
+                entry.update(rouge_scores(summary, ref['summary']))
+                union = set(keywords) | set(ref['keywords'])
+                entry['keyword_overlap'] = round(len(set(keywords) & set(ref['keywords'])) / len(union), 4) if union else 1.0
+                if vectors is not None and ref['vectors'] is not None:
+                    entry['embedding_cosine'] = round(float(np.mean(np.sum(vectors * ref['vectors'], axis=1))), 4)
+                ref_seconds = report[backends[0]]['inputs'][name]
+                entry['summary_speedup'] = round(ref_seconds['summary_seconds'] / max(entry['summary_seconds'], 1e-9), 2)
+                entry['keyword_speedup'] = round(ref_seconds['keyword_seconds'] / max(entry['keyword_seconds'], 1e-9), 2)
+            inputs[name] = entry
+            print(f"   {name:<16} summary {entry['summary_seconds']:.3f}s  keywords {entry['keyword_seconds']:.3f}s"
+                  + (f"  ROUGE-L {entry['rougeL']:.3f}  keyword overlap {entry['keyword_overlap']:.2f}"
+                     if 'rougeL' in entry else ''))
+
+        report[backend] = {
+            'summarizer_model': model_registry.SUMMARIZER_MODEL,
+            'keyword_model': model_registry.KEYWORD_MODEL,
+            'summarizer_load_seconds': round(summarizer_load, 3),
+            'keyword_load_seconds': round(keyword_load, 3),
+            'inputs': inputs
+        }
+        del summarizer, engine
+    return report
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the Lectura.AI pipeline')
+    parser.add_argument('--sizes', type=lambda s: [int(x) for x in s.split(',') if x],
+                        default=[500, 2000, 8000], help='word counts of the synthetic documents')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--stages', default=','.join(STAGES), help='comma-separated subset of ' + ', '.join(STAGES))
+    parser.add_argument('--files', nargs='*', default=[], help='extra inputs (PDF, DOCX, audio) for process_file')
+    parser.add_argument('--warm', action='store_true', help='keep embedding, search and chunk summary caches between runs')
+    parser.add_argument('--stub-latency', type=float, default=0.05, help='seconds added to every stub search')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', help='earlier benchmark JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p50 slowdown before failing')
+    parser.add_argument('--compare-backends', metavar='BACKENDS',
+                        help='comma-separated inference backends (e.g. pytorch,quantized,onnx) to compare '
+                             'for latency and agreement with the first, instead of the pipeline benchmark')
+    args = parser.parse_args(argv)
+
+    if args.compare_backends:
+        with tempfile.TemporaryDirectory(prefix='lectura-bench-') as temp_dir:
+            corpus = build_corpus(args.sizes, temp_dir, args.seed)
+            backends = [b.strip() for b in args.compare_backends.split(',') if b.strip()]
+            report = {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'platform': platform.platform(),
+                'backends': compare_backends(backends, corpus, args.repeats),
+                'peak_rss_bytes': peak_rss()
+            }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📊 Backend comparison written to {args.output}")
+        return 0
+
+    report = run(args)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📊 Peak RSS {report['peak_rss_bytes'] / 1024 ** 2:.0f} MB - results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"⛔ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
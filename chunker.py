@@ -0,0 +1,107 @@
+# chunker.py
+import re
+import zlib
+from bisect import bisect_left
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+# End of a sentence (terminal punctuation, optional closing quote/bracket,
+# then whitespace) or a blank line between paragraphs
+_SENTENCE_END = re.compile(r'(?<=[.!?])["\')\]]*\s+|\n\s*\n')
+# Rough stand-in for subword tokens when no fast tokenizer is available
+_PSEUDO_TOKEN = re.compile(r'\w+|[^\w\s]')
+# Content-defined boundaries: once a chunk is ANCHOR_MIN_FILL full, it ends
+# after the next sentence whose checksum is divisible by ANCHOR_DIVISOR
+ANCHOR_MIN_FILL = 0.75
+ANCHOR_DIVISOR = 4
+
+class Chunk(NamedTuple):
+    text: str
+    tokens: int
+    start: int  # character offsets into the source text
+    end: int
+
+def sentence_spans(text: str) -> Iterator[Tuple[int, int]]:
+    """(start, end) character spans of the sentences in text"""
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        if match.start() > start:
+            yield start, match.start()
+        start = match.end()
+    if text[start:].strip():
+        yield start, len(text.rstrip())
+
+def token_offsets(text: str, tokenizer=None) -> List[Tuple[int, int]]:
+    """Character offsets of every token in text, from one tokenizer pass"""
+    if tokenizer is not None:
+        try:
+            encoding = tokenizer(
+                text,
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                verbose=False
+            )
+            return [tuple(offset) for offset in encoding['offset_mapping']]
+        except Exception:
+            # Slow (Python) tokenizers don't support offset mappings
+            pass
+    return [match.span() for match in _PSEUDO_TOKEN.finditer(text)]
+
+def _is_anchor(sentence: str) -> bool:
+    return zlib.crc32(" ".join(sentence.split()).encode('utf-8')) % ANCHOR_DIVISOR == 0
+
+def chunk_text(text: str, tokenizer=None, budget: int = 1000, content_defined: bool = False) -> List[Chunk]:
+    """Pack whole sentences into chunks of at most budget tokens.
+
+    The text is tokenized once; sentence token counts come from bisecting
+    the token offsets, and chunks are slices of the original string. A
+    sentence longer than the budget is split on token boundaries.
+
+    With content_defined, chunks also end at anchor sentences chosen by
+    their content, so an edit only changes the chunks around it instead of
+    shifting every boundary after it.
+    """
+    offsets = token_offsets(text, tokenizer)
+    starts = [start for start, _ in offsets]
+    chunks: List[Chunk] = []
+    current_start: Optional[int] = None
+    current_end = 0
+    current_tokens = 0
+
+    def flush():
+        nonlocal current_start, current_tokens
+        if current_start is not None:
+            chunks.append(Chunk(text[current_start:current_end], current_tokens, current_start, current_end))
+        current_start = None
+        current_tokens = 0
+
+    for start, end in sentence_spans(text):
+        first = bisect_left(starts, start)
+        last = bisect_left(starts, end)
+        count = last - first
+        if count == 0:
+            continue
+
+        if count > budget:
+            flush()
+            for i in range(first, last, budget):
+                j = min(i + budget, last)
+                chunks.append(Chunk(text[offsets[i][0]:offsets[j - 1][1]], j - i, offsets[i][0], offsets[j - 1][1]))
+            continue
+
+        if current_tokens + count > budget:
+            flush()
+        if current_start is None:
+            current_start = start
+        current_end = end
+        current_tokens += count
+        if content_defined and current_tokens >= budget * ANCHOR_MIN_FILL and _is_anchor(text[start:end]):
+            flush()
+
+    flush()
+    return chunks
+
+def fill_ratio(chunks: List[Chunk], budget: int) -> float:
+    """Average fraction of the token budget used per chunk"""
+    if not chunks:
+        return 0.0
+    return round(sum(chunk.tokens for chunk in chunks) / (len(chunks) * budget), 3)
@@ -1,30 +1,83 @@
 # cleanup.py
 import os
-import shutil
 import atexit
+import threading
+import logging
+import workspace
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_FOLDER = 'uploads'
+EVICTION_INTERVAL = int(os.getenv('EVICTION_INTERVAL', '300'))
+
+_sweeper = None
+_sweeper_args = None  # Restarted with these in forked children (`gunicorn --preload`)
+
+def evict_workspaces(root=UPLOAD_FOLDER, ttl=workspace.WORKSPACE_TTL, keep=()):
+    """Remove upload workspaces that have not been used within ttl seconds"""
+    removed = workspace.evict_expired(root, ttl, keep)
+    if removed:
+        logger.info(f"Evicted {removed} expired workspace(s) from {root}/")
+    return removed
+
+def start_sweeper(root=UPLOAD_FOLDER, ttl=workspace.WORKSPACE_TTL,
+                  interval=EVICTION_INTERVAL, keep=None, on_sweep=None):
+    """Periodically evict expired workspaces in a daemon thread.
+
+    keep is an optional callable returning workspace keys still in use.
+    Threads don't survive fork, so a forked child gets its own sweeper.
+    """
+    global _sweeper, _sweeper_args
+    if _sweeper is not None:
+        return _sweeper
+    _sweeper_args = (root, ttl, interval, keep, on_sweep)
+
+    stop = threading.Event()
+
+    def sweep():
+        while not stop.wait(interval):
+            try:
+                evict_workspaces(root, ttl, keep() if keep else ())
+                if on_sweep:
+                    on_sweep()
+            except Exception as e:
+                logger.error(f"Workspace eviction failed: {e}")
+
+    _sweeper = threading.Thread(target=sweep, name='workspace-sweeper', daemon=True)
+    _sweeper.start()
+    return _sweeper
+
+def _restart_sweeper_after_fork():
+    global _sweeper
+    _sweeper = None
+    if _sweeper_args is not None:
+        start_sweeper(*_sweeper_args)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_sweeper_after_fork)
 
 def cleanup_on_exit():
-    """Remove temporary directories when program exits"""
-    print("\n🧹 Cleaning up temporary files...")
-    
-    # List of directories to clean
-    dirs_to_remove = ['uploads', '__pycache__']
-    
-    for dir_name in dirs_to_remove:
-        try:
-            if os.path.exists(dir_name):
-                if dir_name == '__pycache__':
-                    # Only remove contents of __pycache__ (safer)
-                    for root, dirs, files in os.walk(dir_name):
-                        for file in files:
-                            os.unlink(os.path.join(root, file))
-                    print(f"  - Cleared {dir_name}/")
-                else:
-                    # Remove entire directory for uploads
-                    shutil.rmtree(dir_name)
-                    print(f"  - Removed {dir_name}/")
-        except Exception as e:
-            print(f"  ⚠️ Could not remove {dir_name}: {e}")
+    """Evict expired workspaces and clear bytecode caches on exit.
+
+    Live workspaces are kept: other workers may still be serving them.
+    """
+    logger.info("Cleaning up temporary files")
+
+    try:
+        evict_workspaces()
+    except Exception as e:
+        logger.warning(f"Could not evict workspaces: {e}")
+
+    dir_name = '__pycache__'
+    try:
+        if os.path.exists(dir_name):
+            # Only remove contents of __pycache__ (safer)
+            for root, dirs, files in os.walk(dir_name):
+                for file in files:
+                    os.unlink(os.path.join(root, file))
+            logger.info(f"Cleared {dir_name}/")
+    except Exception as e:
+        logger.warning(f"Could not remove {dir_name}: {e}")
 
 # Register cleanup function
-atexit.register(cleanup_on_exit)
\ No newline at end of file
+atexit.register(cleanup_on_exit)
@@ -0,0 +1,107 @@
+# extractive.py
+import os
+import re
+import math
+import logging
+from collections import Counter
+from typing import List, Optional
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import ArpackError, svds
+import chunker
+
+logger = logging.getLogger(__name__)
+
+# Same defaults as summarizer.cpp
+SUMMARY_RATIO = float(os.getenv('EXTRACTIVE_RATIO', '0.5'))
+STOPWORD_PERCENTAGE = 0.015  # Top 1.5% of words as stopwords
+SVD_COMPONENTS = int(os.getenv('EXTRACTIVE_COMPONENTS', '10'))
+# Below this many sentences/terms a dense SVD is cheaper and ARPACK is unreliable
+DENSE_SVD_LIMIT = 64
+
+_WORD = re.compile(r"[\w']+")
+
+def _tokenize(sentence: str) -> List[str]:
+    """Lowercase words with punctuation (except apostrophes) removed"""
+    return _WORD.findall(sentence.lower())
+
+def generate_stopwords(tokenized: List[List[str]]) -> set:
+    """The most frequent words of the document itself act as stopwords"""
+    freq = Counter(word for tokens in tokenized for word in tokens if len(word) > 1)
+    total = sum(len(tokens) for tokens in tokenized)
+    top_n = max(5, int(total * STOPWORD_PERCENTAGE))
+    return {word for word, _ in freq.most_common(top_n)}
+
+def tfidf_matrix(tokenized: List[List[str]], stopwords: set) -> csr_matrix:
+    """Sparse sentence x term matrix of raw term counts weighted by log(N / (1 + df))"""
+    vocabulary = {}
+    indices, indptr = [], [0]
+    for tokens in tokenized:
+        for word in tokens:
+            if word not in stopwords:
+                indices.append(vocabulary.setdefault(word, len(vocabulary)))
+        indptr.append(len(indices))
+
+    counts = csr_matrix(
+        (np.ones(len(indices)), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+        shape=(len(tokenized), len(vocabulary))
+    )
+    counts.sum_duplicates()
+
+    df = np.bincount(counts.indices, minlength=len(vocabulary))
+    idf = np.log(len(tokenized) / (1.0 + df))
+    return csr_matrix(counts.multiply(idf))
+
+def score_sentences(tfidf: csr_matrix, components: int = SVD_COMPONENTS) -> np.ndarray:
+    """L1 norm of each sentence's loadings on the top singular vectors"""
+    k = min(components, min(tfidf.shape) - 1)
+    if k < 1 or min(tfidf.shape) <= DENSE_SVD_LIMIT:
+        # Too small for a truncated solver - a dense SVD is trivial here
+        u, _, _ = np.linalg.svd(tfidf.toarray(), full_matrices=False)
+        u = u[:, :max(k, 1)]
+    else:
+        u, _, _ = svds(tfidf, k=k)
+    return np.abs(u).sum(axis=1)
+
+def summarize(text: str, ratio: float = SUMMARY_RATIO, max_words: Optional[int] = None) -> Optional[str]:
+    """Pick the highest scoring sentences and return them in document order.
+
+    Keeps ratio of the sentences, or - when max_words is given - as many of
+    the best sentences as fit in max_words.
+    """
+    sentences = []
+    seen = set()
+    for start, end in chunker.sentence_spans(text):
+        sentence = " ".join(text[start:end].split())
+        if sentence and sentence.lower() not in seen:
+            seen.add(sentence.lower())
+            sentences.append(sentence)
+    if not sentences:
+        return None
+    if len(sentences) == 1:
+        return sentences[0]
+
+    tokenized = [_tokenize(sentence) for sentence in sentences]
+    tfidf = tfidf_matrix(tokenized, generate_stopwords(tokenized))
+    if tfidf.nnz == 0:
+        return None
+
+    try:
+        ranked = np.argsort(-score_sentences(tfidf), kind='stable')
+    except (ArpackError, np.linalg.LinAlgError) as e:
+        logger.warning(f"SVD failed ({e}) - falling back to the lead sentences")
+        ranked = np.arange(len(sentences))
+    if max_words is None:
+        selected = ranked[:max(1, math.floor(len(sentences) * ratio))]
+    else:
+        selected, words = [], 0
+        for i in ranked:
+            length = len(tokenized[i])
+            if selected and words + length > max_words:
+                continue
+            selected.append(i)
+            words += length
+            if words >= max_words:
+                break
+
+    return " ".join(sentences[i] for i in sorted(selected))
@@ -0,0 +1,375 @@
+# jobs.py
+import os
+import json
+import time
+import uuid
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import tracing
+import workspace
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+# Job state is written to disk so any worker can answer for any job; saves
+# within a stage are throttled to one per JOB_SAVE_INTERVAL seconds
+JOB_SAVE_INTERVAL = float(os.getenv('JOB_SAVE_INTERVAL', '1.0'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '0.5'))
+# Unfinished jobs are re-saved this often, even mid-stage, as proof of life;
+# one whose heartbeat is older than JOB_HEARTBEAT_TIMEOUT lost its worker
+JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL', '30'))
+JOB_HEARTBEAT_TIMEOUT = 4 * JOB_HEARTBEAT_INTERVAL
+
+class Job:
+    """A single upload moving through the processing stages"""
+
+    def __init__(self, filepath: str, stages: List[str]):
+        self.id = uuid.uuid4().hex
+        self.filepath = filepath
+        self.status = 'queued'
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.results: Dict[str, Any] = {}
+        self.stages = {
+            name: {'status': 'pending', 'started': None, 'finished': None}
+            for name in stages
+        }
+        self.version = 0  # Bumped by notify() whenever results or stages change
+        self._changed = threading.Condition()
+        self._store: Optional['JobStore'] = None
+
+    def notify(self) -> None:
+        """Wake up anyone waiting in wait_for_change"""
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+        if self._store is not None:
+            self._store.save(self)
+
+    def wait_for_change(self, version: int, timeout: Optional[float] = None) -> bool:
+        """Block until the job moves past version; False on timeout"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.version != version, timeout)
+
+    @property
+    def progress(self) -> float:
+        done = sum(1 for s in self.stages.values() if s['status'] == 'done')
+        return round(done / len(self.stages), 2) if self.stages else 1.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'progress': self.progress,
+            'stages': self.stages,
+            'created': self.created,
+            'finished': self.finished
+        }
+
+    def to_state(self) -> Dict[str, Any]:
+        """Everything another worker needs to serve this job"""
+        state = self.to_dict()
+        state.update({
+            'filepath': self.filepath,
+            'version': self.version,
+            'heartbeat': time.time(),
+            # Shallow copies: stages keep appending to these while we serialize
+            'stages': {name: dict(stage) for name, stage in self.stages.items()},
+            'results': {key: value.copy() if isinstance(value, (dict, list)) else value
+                        for key, value in dict(self.results).items()}
+        })
+        return state
+
+class JobSnapshot(Job):
+    """Read-only view of a job running in another worker, refreshed from its state file"""
+
+    def __init__(self, store: 'JobStore', state: Dict[str, Any]):
+        super().__init__(state['filepath'], list(state['stages']))
+        self.id = state['id']
+        self._reader = store
+        self._load(state)
+
+    def _load(self, state: Dict[str, Any]) -> None:
+        self.status = state['status']
+        self.error = state['error']
+        self.created = state['created']
+        self.finished = state['finished']
+        self.stages = state['stages']
+        self.results = state['results']
+        self.version = state['version']
+
+    def notify(self) -> None:
+        raise RuntimeError(f"Job {self.id} belongs to another worker")
+
+    def wait_for_change(self, version: int, timeout: Optional[float] = None) -> bool:
+        """Poll the state file until the job moves past version; False on timeout"""
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = self._reader.read(self.id)
+            if state is not None and state['version'] != version:
+                self._load(state)
+                return True
+            if end is not None and time.monotonic() >= end:
+                return False
+            time.sleep(JOB_POLL_INTERVAL if end is None else
+                       max(0.0, min(JOB_POLL_INTERVAL, end - time.monotonic())))
+
+class JobStore:
+    """Job state as <directory>/<job id>.json, shared by every worker process"""
+
+    def __init__(self, directory: str, interval: float = JOB_SAVE_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self._saved: Dict[str, Tuple[float, Any]] = {}  # job id -> (time, stage statuses)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str) -> Optional[str]:
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def save(self, job: Job, force: bool = False) -> None:
+        """Write job state; updates within a stage are throttled, transitions never are"""
+        phase = (job.status, tuple(stage['status'] for stage in job.stages.values()))
+        now = time.monotonic()
+        with self._lock:
+            last = self._saved.get(job.id)
+            if not force and last is not None and last[1] == phase and now - last[0] < self.interval:
+                return
+            self._saved[job.id] = (now, phase)
+            if job.finished is not None:
+                self._saved.pop(job.id)
+        try:
+            workspace.write_atomic(self._path(job.id), json.dumps(job.to_state(), default=str))
+        except (OSError, TypeError, ValueError, RuntimeError) as e:
+            logger.warning(f"Could not save state of job {job.id}: {e}", extra={'job': job.id})
+
+    def read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, job_id: str) -> Optional[JobSnapshot]:
+        state = self.read(job_id)
+        return None if state is None else JobSnapshot(self, state)
+
+    def active(self, max_age: float = JOB_HEARTBEAT_TIMEOUT) -> List[JobSnapshot]:
+        """Unfinished jobs of any worker whose heartbeat is within max_age seconds"""
+        cutoff = time.time() - max_age
+        jobs = []
+        for name, state in self._states():
+            if state is not None and state['finished'] is None and self._heartbeat(name, state) >= cutoff:
+                jobs.append(JobSnapshot(self, state))
+        return jobs
+
+    def evict(self, max_age: float) -> int:
+        """Remove state of jobs finished, or abandoned by their worker, over max_age seconds ago"""
+        cutoff = time.time() - max_age
+        removed = 0
+        for name, state in self._states():
+            if state is not None and state['finished'] is not None:
+                last = state['finished']
+            else:
+                last = self._heartbeat(name, state)  # Running jobs keep theirs fresh
+            if last < cutoff:
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                    removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def _states(self) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        return [(name, self.read(name[:-len('.json')])) for name in self._names()]
+
+    def _heartbeat(self, name: str, state: Optional[Dict[str, Any]]) -> float:
+        if state is not None and state.get('heartbeat') is not None:
+            return state['heartbeat']
+        try:
+            return os.path.getmtime(os.path.join(self.directory, name))
+        except OSError:
+            return 0.0
+
+    def _names(self) -> List[str]:
+        try:
+            return [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        except OSError:
+            return []
+
+class JobQueue:
+    """Runs jobs through an ordered list of stages on a local thread pool.
+
+    A stage can be capped by a named concurrency slot, so e.g. only N
+    Whisper transcriptions run at once. slot(stage, job) picks the slot for
+    a job's stage (None for no limit), which lets cheap work - extracting a
+    .txt - bypass the cap meant for audio. A job whose slot is full is
+    parked instead of holding a worker thread, and is resubmitted once a
+    slot frees up, so cheap stages keep flowing.
+
+    With a JobStore, job state is also written to disk so that get() in
+    any worker process can serve jobs run by the others. A heartbeat thread
+    re-saves unfinished jobs so long stages still look alive to them.
+    """
+
+    def __init__(self, stages: List[Tuple[str, Callable[[Job], None]]],
+                 limits: Optional[Dict[str, int]] = None,
+                 workers: int = JOB_WORKERS,
+                 slot: Optional[Callable[[str, Job], Optional[str]]] = None,
+                 store: Optional[JobStore] = None):
+        self._stages = stages
+        self._store = store
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._limits = dict(limits or {})
+        self._slot = slot or (lambda name, job: name)
+        self._in_use: Dict[str, int] = {}
+        self._parked: Dict[str, Deque[Tuple[Job, int]]] = {}
+        self._heartbeat_pid: Optional[int] = None
+
+    def submit(self, filepath: str) -> Job:
+        job = Job(filepath, [name for name, _ in self._stages])
+        if self._stages:
+            # Counted by queue_depth while it waits for an executor thread
+            job.stages[self._stages[0][0]]['status'] = 'waiting'
+        with self._lock:
+            self._jobs[job.id] = job
+        if self._store is not None:
+            job._store = self._store
+            self._store.save(job)
+            self._start_heartbeat()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None and self._store is not None:
+            return self._store.load(job_id)
+        return job
+
+    def active(self, max_age: float = JOB_HEARTBEAT_TIMEOUT) -> List[Job]:
+        """Jobs that have not finished yet, including other workers' live jobs"""
+        active = {job.id: job for job in list(self._jobs.values()) if job.finished is None}
+        if self._store is not None:
+            for job in self._store.active(max_age):
+                active.setdefault(job.id, job)
+        return list(active.values())
+
+    def evict(self, max_age: float) -> int:
+        """Forget finished jobs older than max_age seconds"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished is not None and job.finished < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        if self._store is not None:
+            self._store.evict(max_age)
+        return len(expired)
+
+    def _start_heartbeat(self) -> None:
+        """Start the heartbeat thread once per process (threads don't survive fork)"""
+        with self._lock:
+            if self._heartbeat_pid == os.getpid():
+                return
+            self._heartbeat_pid = os.getpid()
+        threading.Thread(target=self._beat, name='job-heartbeat', daemon=True).start()
+
+    def _beat(self) -> None:
+        while True:
+            time.sleep(JOB_HEARTBEAT_INTERVAL)
+            for job in list(self._jobs.values()):
+                if job.finished is None:
+                    self._store.save(job, force=True)
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Number of jobs waiting on (slot or executor) or running each stage"""
+        depth = {name: 0 for name, _ in self._stages}
+        for job in list(self._jobs.values()):
+            for name, stage in job.stages.items():
+                if job.status in ('queued', 'running') and stage['status'] in ('waiting', 'running'):
+                    depth[name] += 1
+        return depth
+
+    def _acquire(self, slot: Optional[str], job: Job, index: int) -> bool:
+        """Take a slot, or park the job on it and return False"""
+        if slot is None or not self._limits.get(slot):
+            return True
+        with self._lock:
+            if self._in_use.get(slot, 0) < self._limits[slot]:
+                self._in_use[slot] = self._in_use.get(slot, 0) + 1
+                return True
+            self._parked.setdefault(slot, deque()).append((job, index))
+            return False
+
+    def _release(self, slot: Optional[str]) -> None:
+        if slot is None or not self._limits.get(slot):
+            return
+        with self._lock:
+            parked = self._parked.get(slot)
+            if not parked:
+                self._in_use[slot] -= 1
+                return
+            # Hand the slot straight to the oldest parked job
+            job, index = parked.popleft()
+        self._executor.submit(self._run, job, index, True)
+
+    def _run(self, job: Job, index: int = 0, acquired: bool = False) -> None:
+        with tracing.trace(job.id):
+            self._run_stages(job, index, acquired)
+
+    def _run_stages(self, job: Job, index: int, acquired: bool) -> None:
+        job.status = 'running'
+        try:
+            while index < len(self._stages):
+                name, func = self._stages[index]
+                stage = job.stages[name]
+                slot = self._slot(name, job)
+                if not acquired:
+                    stage['status'] = 'waiting'
+                    job.notify()
+                    if not self._acquire(slot, job, index):
+                        return  # Parked; _release resubmits the job
+                acquired = False
+                try:
+                    stage['status'] = 'running'
+                    stage['started'] = time.time()
+                    job.notify()
+                    with tracing.span(name, job=job.id), tracing.profiled(f'job-{name}'):
+                        func(job)
+                    stage['finished'] = time.time()
+                    stage['status'] = 'done'
+                    job.notify()
+                finally:
+                    self._release(slot)
+                index += 1
+            job.status = 'done'
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}", extra={'job': job.id})
+            for stage in job.stages.values():
+                if stage['status'] in ('waiting', 'running'):
+                    stage['status'] = 'failed'
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished = time.time()
+        job.notify()
+
+def stage_limits_from_env(stages: List[str]) -> Dict[str, int]:
+    """Read STAGE_LIMIT_<NAME> (e.g. STAGE_LIMIT_EXTRACT=1) for each stage"""
+    limits = {}
+    for name in stages:
+        value = os.getenv(f'STAGE_LIMIT_{name.upper()}')
+        if value:
+            limits[name] = int(value)
+    return limits
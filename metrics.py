@@ -0,0 +1,150 @@
+# metrics.py
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; covers quick cache hits up to long Whisper transcriptions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def lines(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f'{self.name}{_format_labels(k)} {_format_value(v)}' for k, v in sorted(values.items())]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_key(labels)] = value
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts, then sum
+
+    def observe(self, value: float, **labels) -> None:
+        key = _key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-1] += value
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        lines = []
+        for key, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{_format_labels(key, ("le", _format_value(bound)))} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {_format_value(round(values[-1], 6))}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {values[len(self.buckets) - 1]}')
+        return lines
+
+class CallbackGauge(Metric):
+    """Gauge whose values are read from a callback at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, callback: Callable[[], Iterable[Tuple[Dict[str, object], float]]]):
+        super().__init__(name, help)
+        self.callback = callback
+
+    def lines(self) -> List[str]:
+        return [f'{self.name}{_format_labels(_key(labels))} {_format_value(value)}'
+                for labels, value in self.callback()]
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self.register(Gauge(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def callback(self, name: str, help: str,
+                 callback: Callable[[], Iterable[Tuple[Dict[str, object], float]]]) -> CallbackGauge:
+        with self._lock:
+            # Replaced rather than kept, so a reloaded module can re-register
+            metric = self._metrics[name] = CallbackGauge(name, help, callback)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        out = []
+        for metric in metrics:
+            try:
+                lines = metric.lines()
+            except Exception:
+                continue  # A failing callback must not break the whole scrape
+            out.append(f'# HELP {metric.name} {metric.help}')
+            out.append(f'# TYPE {metric.name} {metric.kind}')
+            out.extend(lines)
+        return '\n'.join(out) + '\n'
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram('lectura_stage_seconds', 'Duration of traced pipeline stages')
+STAGE_INFLIGHT = registry.gauge('lectura_stage_inflight', 'Traced stages currently running')
+STAGE_ERRORS = registry.counter('lectura_stage_errors_total', 'Traced stages that raised')
+HTTP_SECONDS = registry.histogram('lectura_http_request_seconds', 'Duration of HTTP requests')
+HTTP_INFLIGHT = registry.gauge('lectura_http_inflight', 'HTTP requests currently being served')
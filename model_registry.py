@@ -0,0 +1,250 @@
+# model_registry.py
+import os
+import json
+import time
+import threading
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Smaller distilled checkpoints selected with SUMMARIZER_MODEL=distilled / KEYWORD_MODEL=distilled
+DISTILLED_MODELS = {
+    'summarizer': 'sshleifer/distilbart-cnn-12-6',
+    'keyword': 'paraphrase-MiniLM-L3-v2'
+}
+
+WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')
+SUMMARIZER_MODEL = os.getenv('SUMMARIZER_MODEL', 'facebook/bart-large-cnn')
+if SUMMARIZER_MODEL == 'distilled':
+    SUMMARIZER_MODEL = DISTILLED_MODELS['summarizer']
+KEYWORD_MODEL = os.getenv('KEYWORD_MODEL', 'all-MiniLM-L6-v2')  # KeyBERT's default
+if KEYWORD_MODEL == 'distilled':
+    KEYWORD_MODEL = DISTILLED_MODELS['keyword']
+
+# CPU inference backend: "pytorch" (fp32), "quantized" (dynamic int8 Linear
+# layers) or "onnx" (ONNX Runtime, exported once into ONNX_CACHE_DIR)
+BACKENDS = ('pytorch', 'quantized', 'onnx')
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'pytorch')
+SUMMARIZER_BACKEND = os.getenv('SUMMARIZER_BACKEND', INFERENCE_BACKEND)
+KEYWORD_BACKEND = os.getenv('KEYWORD_BACKEND', INFERENCE_BACKEND)
+ONNX_CACHE_DIR = os.getenv('ONNX_CACHE_DIR', os.path.join('cache', 'onnx'))
+
+_loaders: Dict[str, Callable[[], Any]] = {}
+_models: Dict[str, Any] = {}
+_stats: Dict[str, Dict[str, float]] = {}
+_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+def _current_rss() -> int:
+    """Resident set size of this process in bytes (0 if unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is in kilobytes on Linux - a peak, but better than nothing
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return 0
+
+def register_model(name: str, loader: Callable[[], Any]) -> None:
+    """Register a zero-argument loader under name (replaces any unloaded entry)"""
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+
+def get_model(name: str) -> Any:
+    """Return the shared instance of a model, loading it on first use"""
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    if name not in _loaders:
+        raise KeyError(f"Unknown model: {name}")
+
+    with _locks[name]:
+        # Another thread may have finished loading while we waited
+        model = _models.get(name)
+        if model is not None:
+            return model
+
+        rss_before = _current_rss()
+        start = time.perf_counter()
+        model = _loaders[name]()
+        _stats[name] = {
+            'load_seconds': round(time.perf_counter() - start, 3),
+            'rss_bytes': max(0, _current_rss() - rss_before),
+            'loaded_at': time.time(),
+            'pid': os.getpid()
+        }
+        _models[name] = model
+        logger.info(f"Loaded model '{name}' in {_stats[name]['load_seconds']}s")
+        return model
+
+def is_loaded(name: str) -> bool:
+    return name in _models
+
+def preload(names: Optional[Iterable[str]] = None) -> None:
+    """Load models up front, e.g. in the gunicorn master with --preload so
+    forked workers share the weights copy-on-write.
+
+    Defaults to the comma-separated PRELOAD_MODELS environment variable.
+    """
+    if names is None:
+        names = [n.strip() for n in os.getenv('PRELOAD_MODELS', '').split(',') if n.strip()]
+    for name in names:
+        try:
+            get_model(name)
+        except Exception as e:
+            logger.error(f"Preloading model '{name}' failed: {e}")
+
+def model_stats() -> Dict[str, Dict[str, Any]]:
+    """Load time and resident memory per model, plus current process RSS"""
+    return {
+        'process_rss_bytes': _current_rss(),
+        'models': {
+            name: dict(_stats.get(name, {}), loaded=name in _models)
+            for name in _loaders
+        }
+    }
+
+def _load_whisper():
+    import whisper
+    return whisper.load_model(WHISPER_MODEL)
+
+def _check_backend(backend: str) -> None:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+
+def _onnx_path(model_name: str) -> str:
+    return os.path.join(ONNX_CACHE_DIR, model_name.replace('/', '--'))
+
+def _optimum(name: str):
+    try:
+        import optimum.onnxruntime
+    except ImportError:
+        raise ImportError("The onnx backend needs: pip install optimum[onnxruntime]")
+    return getattr(optimum.onnxruntime, name)
+
+def _quantize(model):
+    """Dynamic int8 quantization of every Linear layer (weights stored int8,
+    activations quantized on the fly) - no calibration data needed"""
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def summarizer_signature() -> str:
+    """Identifies summarizer output for caching: model plus backend"""
+    if SUMMARIZER_BACKEND == 'pytorch':
+        return SUMMARIZER_MODEL  # Keeps entries cached before backends existed
+    return f"{SUMMARIZER_MODEL}@{SUMMARIZER_BACKEND}"
+
+def keyword_signature() -> str:
+    """Identifies the embedding space of the keyword model: model plus backend"""
+    return f"{KEYWORD_MODEL}@{KEYWORD_BACKEND}"
+
+def load_summarizer(model_name: Optional[str] = None, backend: Optional[str] = None):
+    """transformers summarization pipeline for model_name on the given backend"""
+    from transformers import AutoTokenizer, pipeline
+    model_name = model_name or SUMMARIZER_MODEL
+    backend = backend or SUMMARIZER_BACKEND
+    _check_backend(backend)
+
+    if backend == 'pytorch':
+        return pipeline("summarization", model=model_name, framework="pt")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == 'quantized':
+        from transformers import AutoModelForSeq2SeqLM
+        model = _quantize(AutoModelForSeq2SeqLM.from_pretrained(model_name))
+    else:
+        ORTModelForSeq2SeqLM = _optimum('ORTModelForSeq2SeqLM')
+        path = _onnx_path(model_name)
+        if os.path.isdir(path):
+            model = ORTModelForSeq2SeqLM.from_pretrained(path)
+        else:
+            model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+            model.save_pretrained(path)
+            tokenizer.save_pretrained(path)
+    return pipeline("summarization", model=model, tokenizer=tokenizer)
+
+def load_keyword_model(model_name: Optional[str] = None, backend: Optional[str] = None):
+    """KeyBERT on a sentence-transformer run by the given backend"""
+    from keybert import KeyBERT
+    model_name = model_name or KEYWORD_MODEL
+    backend = backend or KEYWORD_BACKEND
+    _check_backend(backend)
+
+    if backend == 'onnx':
+        return KeyBERT(model=_onnx_embedder(model_name))
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, device='cpu')
+    if backend == 'quantized':
+        model = _quantize(model)
+    return KeyBERT(model=model)
+
+def _onnx_embedder(model_name: str):
+    """KeyBERT embedding backend running a sentence-transformer under ONNX Runtime"""
+    import numpy as np
+    from keybert.backend import BaseEmbedder
+    from transformers import AutoTokenizer
+    ORTModelForFeatureExtraction = _optimum('ORTModelForFeatureExtraction')
+
+    repo = model_name if '/' in model_name else f'sentence-transformers/{model_name}'
+    path = _onnx_path(repo)
+    if os.path.isdir(path):
+        model = ORTModelForFeatureExtraction.from_pretrained(path)
+        tokenizer = AutoTokenizer.from_pretrained(path)
+    else:
+        model = ORTModelForFeatureExtraction.from_pretrained(repo, export=True)
+        tokenizer = AutoTokenizer.from_pretrained(repo)
+        model.save_pretrained(path)
+        tokenizer.save_pretrained(path)
+        try:
+            # sentence-transformers truncates below the tokenizer's limit (e.g. 128 or 256)
+            from huggingface_hub import hf_hub_download
+            with open(hf_hub_download(repo, 'sentence_bert_config.json'), 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            with open(os.path.join(path, 'sentence_bert_config.json'), 'w', encoding='utf-8') as f:
+                json.dump(config, f)
+        except Exception as e:
+            logger.warning(f"No sentence_bert_config.json for {repo}: {e}")
+
+    max_seq_length = min(tokenizer.model_max_length, 512)
+    try:
+        with open(os.path.join(path, 'sentence_bert_config.json'), 'r', encoding='utf-8') as f:
+            max_seq_length = int(json.load(f)['max_seq_length'])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    class OnnxEmbedder(BaseEmbedder):
+        # Same attributes as a SentenceTransformer, so callers can size their inputs
+        def __init__(self):
+            super().__init__()
+            self.tokenizer = tokenizer
+            self.max_seq_length = max_seq_length
+
+        def embed(self, documents, verbose=False):
+            encoded = tokenizer(list(documents), padding=True, truncation=True,
+                                max_length=self.max_seq_length, return_tensors='np')
+            hidden = model(**encoded).last_hidden_state
+            # Mean pooling over real tokens, as sentence-transformers does
+            mask = encoded['attention_mask'][..., None].astype(np.float32)
+            return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    return OnnxEmbedder()
+
+def _load_bart():
+    return load_summarizer()
+
+def _load_keybert():
+    return load_keyword_model()
+
+register_model('whisper', _load_whisper)
+register_model('bart', _load_bart)
+register_model('keybert', _load_keybert)
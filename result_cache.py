@@ -0,0 +1,109 @@
+# result_cache.py
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+import workspace
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', 'cache')
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+class ResultCache:
+    """Persistent cache of pipeline stage outputs.
+
+    Entries are keyed by the SHA-256 of the uploaded bytes plus the stage
+    name and the parameters that influence its output (model names etc.),
+    stored as one JSON file each and evicted least-recently-used first once
+    the directory grows past max_bytes.
+    """
+
+    def __init__(self, directory: str = RESULT_CACHE_DIR, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, stage: str, content_hash: str, params: Dict[str, Any]) -> str:
+        raw = json.dumps([stage, content_hash, params], sort_keys=True)
+        return os.path.join(self.directory, hashlib.sha256(raw.encode('utf-8')).hexdigest() + '.json')
+
+    def _count(self, stage: str, outcome: str) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(stage, {'hits': 0, 'misses': 0})
+            counters[outcome] += 1
+
+    def get(self, stage: str, content_hash: str, max_age: Optional[float] = None, **params) -> Optional[Any]:
+        """Cached value for this stage/content/params, or None on a miss"""
+        path = self._path(stage, content_hash, params)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._count(stage, 'misses')
+            return None
+
+        if max_age is not None and time.time() - entry.get('created', 0) > max_age:
+            self._count(stage, 'misses')
+            return None
+
+        workspace.touch(path)  # mtime doubles as the LRU timestamp
+        self._count(stage, 'hits')
+        return entry['value']
+
+    def put(self, stage: str, content_hash: str, value: Any, **params) -> None:
+        path = self._path(stage, content_hash, params)
+        entry = {'stage': stage, 'params': params, 'created': time.time(), 'value': value}
+        try:
+            workspace.write_atomic(path, json.dumps(entry))
+            self._evict()
+        except OSError as e:
+            logger.error(f"Result cache write failed: {e}")
+
+    def put_many(self, stage: str, entries: List[Tuple[str, Any, Dict[str, Any]]]) -> None:
+        """Store several (content_hash, value, params) entries, evicting once at the end"""
+        try:
+            for content_hash, value, params in entries:
+                entry = {'stage': stage, 'params': params, 'created': time.time(), 'value': value}
+                workspace.write_atomic(self._path(stage, content_hash, params), json.dumps(entry))
+            if entries:
+                self._evict()
+        except OSError as e:
+            logger.error(f"Result cache write failed: {e}")
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                continue
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {stage: dict(c) for stage, c in self._counters.items()}
+        for c in counters.values():
+            lookups = c['hits'] + c['misses']
+            c['hit_ratio'] = round(c['hits'] / lookups, 3) if lookups else 0.0
+        return {'directory': self.directory, 'max_bytes': self.max_bytes, 'stages': counters}
+
+result_cache = ResultCache()
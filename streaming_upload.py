@@ -0,0 +1,312 @@
+# streaming_upload.py
+import os
+import re
+import json
+import hmac
+import uuid
+import hashlib
+import secrets
+import threading
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+import workspace
+
+try:
+    import fcntl
+except ImportError:  # Windows: the per-process lock is all there is
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024
+# Largest file accepted through the resumable protocol
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', str(8 * 1024 * 1024 * 1024)))
+# Size clients are asked to send per PUT request
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+# A client claiming already uploaded content must send back this many
+# randomly placed ranges of it before the stored copy is reused
+PROOF_RANGES = 4
+PROOF_RANGE_SIZE = 4096
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+class UploadError(Exception):
+    """A problem with the client's upload, reported with an HTTP status"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+def copy_stream(stream: BinaryIO, out: BinaryIO, digest, limit: Optional[int] = None) -> int:
+    """Copy stream to out in blocks, feeding every block to digest"""
+    written = 0
+    while True:
+        block = stream.read(CHUNK_SIZE)
+        if not block:
+            break
+        if limit is not None and written + len(block) > limit:
+            raise UploadError('Upload larger than announced size', 413)
+        digest.update(block)
+        out.write(block)
+        written += len(block)
+    return written
+
+def save_stream(stream: BinaryIO, path: str, limit: Optional[int] = None) -> Tuple[int, str]:
+    """Write a request body to path without buffering it; returns (size, sha256)"""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        size = copy_stream(stream, out, digest, limit)
+    return size, digest.hexdigest()
+
+def save_multipart(stream: BinaryIO, boundary: str, target: Callable[[str], str],
+                   field: str = 'file', limit: Optional[int] = None) -> Tuple[str, str, int, str]:
+    """Write one file field of a multipart/form-data body to disk as it arrives.
+
+    Werkzeug's form parser spools the whole file before the view runs; here
+    the part goes straight to target(filename), which may raise UploadError
+    to reject it. Returns (filename, path, size, sha256).
+    """
+    from werkzeug.exceptions import RequestEntityTooLarge
+    from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NEED_DATA
+
+    # Bounds the parser's unconsumed buffer, i.e. one block plus a partial boundary
+    decoder = MultipartDecoder(boundary.encode('latin-1'), max_form_memory_size=2 * CHUNK_SIZE)
+    digest = hashlib.sha256()
+    filename = path = out = None
+    size = 0
+    writing = finished = False
+    try:
+        try:
+            while not finished:
+                block = stream.read(CHUNK_SIZE)
+                decoder.receive_data(block or None)
+                while not finished:
+                    event = decoder.next_event()
+                    if event is NEED_DATA:
+                        break
+                    if isinstance(event, (Field, File)):
+                        writing = isinstance(event, File) and event.name == field and path is None
+                        if writing:
+                            filename = event.filename or ''
+                            path = target(filename)
+                            out = open(path, 'wb')
+                    elif isinstance(event, Data) and writing:
+                        if limit is not None and size + len(event.data) > limit:
+                            raise UploadError('File too large', 413)
+                        digest.update(event.data)
+                        out.write(event.data)
+                        size += len(event.data)
+                    elif isinstance(event, Epilogue):
+                        finished = True
+                if not block:
+                    break
+        except ValueError:
+            raise UploadError('Malformed multipart body')
+        except RequestEntityTooLarge:
+            raise UploadError('Form part too large', 413)
+        if not finished:
+            raise UploadError('Incomplete upload')
+        if path is None:
+            raise UploadError('No file part')
+    except BaseException:
+        if out is not None:
+            out.close()
+            os.unlink(path)
+        raise
+    out.close()
+    return filename, path, size, digest.hexdigest()
+
+def find_existing(root: str, sha256: str, filename: str) -> Optional[str]:
+    """Path of an already uploaded file with this content hash, if any"""
+    path = workspace.get_workspace(root, sha256)
+    if path is None:
+        return None
+    source = os.path.join(path, f'source{os.path.splitext(filename)[1].lower()}')
+    return source if os.path.exists(source) else None
+
+def _challenge(size: int) -> List[List[int]]:
+    """Random [offset, length] ranges of a size-byte file; small files are sent whole"""
+    if size <= PROOF_RANGES * PROOF_RANGE_SIZE:
+        return [[0, size]]
+    return sorted([secrets.randbelow(size - PROOF_RANGE_SIZE + 1), PROOF_RANGE_SIZE]
+                  for _ in range(PROOF_RANGES))
+
+def _ranges_digest(path: str, ranges: List[List[int]]) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for offset, length in ranges:
+            f.seek(offset)
+            digest.update(f.read(length))
+    return digest.hexdigest()
+
+def _read_exactly(stream: BinaryIO, length: int) -> bytes:
+    """Up to length + 1 bytes, so a body that is too long can be told apart"""
+    data = b''
+    while len(data) <= length:
+        block = stream.read(length + 1 - len(data))
+        if not block:
+            break
+        data += block
+    return data
+
+def _lock_file(f: BinaryIO) -> None:
+    """Exclusive lock across worker processes, released when f is closed"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+class ResumableUploads:
+    """Chunked uploads that survive dropped connections.
+
+    Bytes are appended to <id>.part in the incoming directory, next to an
+    <id>.json manifest, so any worker can continue an upload. The SHA-256
+    is updated as chunks arrive; a worker that has not seen the upload
+    before rebuilds it from the partial file.
+
+    When the client's claimed SHA-256 matches a stored upload, it gets one
+    chance to prove it has the file (see prove) before sending any chunks.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.directory = os.path.join(root, workspace.INCOMING_DIR)
+        self._digests: Dict[str, Tuple[int, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, upload_id: str) -> Tuple[str, str]:
+        if not _UPLOAD_ID.match(upload_id or ''):
+            raise UploadError('Upload not found', 404)
+        base = os.path.join(self.directory, upload_id)
+        return base + '.json', base + '.part'
+
+    def _manifest(self, upload_id: str) -> Dict[str, Any]:
+        manifest_path, _ = self._paths(upload_id)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadError('Upload not found', 404)
+
+    def _upload_lock(self, upload_id: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def create(self, filename: str, size: int, sha256: Optional[str] = None,
+               existing: Optional[str] = None) -> Dict[str, Any]:
+        """Start an upload; existing is a stored file matching the claimed sha256"""
+        if size < 0 or size > MAX_UPLOAD_SIZE:
+            raise UploadError('File too large', 413)
+        os.makedirs(self.directory, exist_ok=True)
+
+        manifest = {
+            'upload_id': uuid.uuid4().hex,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None
+        }
+        challenge = None
+        if existing is not None and os.path.getsize(existing) == size:
+            challenge = _challenge(size)
+            manifest['proof'] = {'path': existing, 'ranges': challenge,
+                                 'digest': _ranges_digest(existing, challenge)}
+        manifest_path, part_path = self._paths(manifest['upload_id'])
+        open(part_path, 'wb').close()
+        workspace.write_atomic(manifest_path, json.dumps(manifest))
+        status = self.status(manifest['upload_id'])
+        if challenge is not None:
+            status['challenge'] = challenge
+        return status
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        manifest = self._manifest(upload_id)
+        manifest.pop('proof', None)  # The expected answer stays on the server
+        _, part_path = self._paths(upload_id)
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        return dict(manifest, offset=offset, chunk_size=UPLOAD_CHUNK_SIZE,
+                    complete=offset == manifest['size'])
+
+    def prove(self, upload_id: str, stream: BinaryIO) -> Optional[str]:
+        """Check the challenge answer (the ranges' bytes, concatenated).
+
+        Returns the stored file on success and drops the upload; on failure
+        the upload simply continues with chunks. Only one attempt is allowed.
+        """
+        manifest_path, part_path = self._paths(upload_id)
+        with self._upload_lock(upload_id):
+            manifest = self._manifest(upload_id)
+            proof = manifest.pop('proof', None)
+            if proof is None:
+                raise UploadError('No pending challenge', 409)
+            workspace.write_atomic(manifest_path, json.dumps(manifest))
+
+        length = sum(size for _, size in proof['ranges'])
+        answer = _read_exactly(stream, length)
+        if len(answer) != length or not os.path.exists(proof['path']):
+            return None
+        if not hmac.compare_digest(hashlib.sha256(answer).hexdigest(), proof['digest']):
+            return None
+
+        for path in (manifest_path, part_path):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._locks.pop(upload_id, None)
+        return proof['path']
+
+    def append(self, upload_id: str, offset: int, stream: BinaryIO) -> Dict[str, Any]:
+        """Append a chunk that must start exactly at offset"""
+        manifest = self._manifest(upload_id)
+        manifest_path, part_path = self._paths(upload_id)
+
+        with self._upload_lock(upload_id):
+            try:
+                out = open(part_path, 'r+b')
+            except FileNotFoundError:
+                raise UploadError('Upload not found', 404)
+            with out:
+                # A retried chunk may reach another worker process at the same time
+                _lock_file(out)
+                current = out.seek(0, os.SEEK_END)
+                if offset != current:
+                    raise UploadError(f'Expected offset {current}', 409)
+
+                digest = self._digest(upload_id, part_path, current)
+                try:
+                    written = copy_stream(stream, out, digest, manifest['size'] - current)
+                    out.flush()
+                except Exception:
+                    # Drop the partial chunk so the client can resend it from current
+                    out.truncate(current)
+                    self._digests.pop(upload_id, None)
+                    raise
+            self._digests[upload_id] = (current + written, digest)
+            workspace.touch(manifest_path)  # Keep in-progress uploads away from eviction
+        return self.status(upload_id)
+
+    def _digest(self, upload_id: str, part_path: str, offset: int):
+        cached = self._digests.get(upload_id)
+        if cached is not None and cached[0] == offset:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(block)
+        return digest
+
+    def finish(self, upload_id: str) -> Tuple[str, str, str]:
+        """Close a complete upload; returns (part_path, filename, sha256)"""
+        status = self.status(upload_id)
+        if not status['complete']:
+            raise UploadError('Upload incomplete', 409)
+
+        manifest_path, part_path = self._paths(upload_id)
+        with self._upload_lock(upload_id):
+            sha256 = self._digest(upload_id, part_path, status['offset']).hexdigest()
+            self._digests.pop(upload_id, None)
+        with self._lock:
+            self._locks.pop(upload_id, None)
+
+        if status['sha256'] and status['sha256'] != sha256:
+            os.unlink(part_path)
+            os.unlink(manifest_path)
+            raise UploadError('Checksum mismatch', 422)
+        os.unlink(manifest_path)
+        return part_path, status['filename'], sha256
@@ -1,120 +1,496 @@
 # study_recommender.py
-from keybert import KeyBERT
 import requests
-import wikipedia
+from requests.adapters import HTTPAdapter
 import os
 import re
+import html
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeout
 from dotenv import load_dotenv
 import logging
-from typing import Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
 import cleanup
+import model_registry
+import chunker
+import vector_index
+import tracing
 
 load_dotenv()
 YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
+# Overridable so searches can be pointed at a local stand-in server
+YOUTUBE_API_URL = os.getenv('YOUTUBE_API_URL', 'https://www.googleapis.com/youtube/v3/search')
+WIKIPEDIA_API_URL = os.getenv('WIKIPEDIA_API_URL', 'https://en.wikipedia.org/w/api.php')
+SEARCH_TIMEOUT = float(os.getenv('SEARCH_TIMEOUT', '15'))
+SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', '10'))
+# Overall budget for all lookups; whatever has finished by then is returned
+RECOMMENDATION_DEADLINE = float(os.getenv('RECOMMENDATION_DEADLINE', '20'))
+
+# Keyword-level search cache. Fresh entries are served directly, stale ones
+# (up to SEARCH_CACHE_STALE seconds past their TTL) are served while a
+# background refresh runs, and failures are remembered for a short while.
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '2048'))
+SEARCH_CACHE_DB = os.getenv('SEARCH_CACHE_DB', '')  # SQLite path; empty keeps the cache in memory only
+SEARCH_CACHE_TTL = {
+    'youtube': int(os.getenv('SEARCH_CACHE_TTL_YOUTUBE', str(24 * 3600))),
+    'wikipedia': int(os.getenv('SEARCH_CACHE_TTL_WIKIPEDIA', str(7 * 24 * 3600)))
+}
+SEARCH_CACHE_STALE = int(os.getenv('SEARCH_CACHE_STALE', str(24 * 3600)))
+SEARCH_CACHE_NEGATIVE_TTL = int(os.getenv('SEARCH_CACHE_NEGATIVE_TTL', '300'))
+
+# Keyword engine: only the KEYWORD_CANDIDATES best TF-IDF phrases are embedded
+KEYWORD_CANDIDATES = int(os.getenv('KEYWORD_CANDIDATES', '50'))
+KEYWORD_CHUNK_TOKENS = int(os.getenv('KEYWORD_CHUNK_TOKENS', '256'))
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '32'))
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '20000'))
+
+# Recommendation re-ranking: results are ordered by similarity to the whole
+# transcript, and one whose embedding is within DEDUP_THRESHOLD of a better
+# result is dropped. A source is answered from the local index, without any
+# network calls, when it already holds INDEX_SERVE_RESULTS items at least
+# INDEX_SERVE_THRESHOLD similar to the transcript.
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.92'))
+INDEX_SERVE_RESULTS = int(os.getenv('INDEX_SERVE_RESULTS', '7'))
+INDEX_SERVE_THRESHOLD = float(os.getenv('INDEX_SERVE_THRESHOLD', '0.6'))
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# One keep-alive connection pool shared by every search thread
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=SEARCH_WORKERS))
+session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=SEARCH_WORKERS))
+
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix='search')
+_latencies: Dict[str, deque] = {}
+_outcomes: Dict[str, Dict[str, int]] = {}
+_metrics_lock = threading.Lock()
+
+def _record(source: str, seconds: float, ok: bool) -> None:
+    with _metrics_lock:
+        _latencies.setdefault(source, deque(maxlen=500)).append(seconds)
+        outcome = _outcomes.setdefault(source, {'ok': 0, 'errors': 0, 'timeouts': 0})
+        outcome['ok' if ok else 'errors'] += 1
+
+def _timed(source: str, func: Callable[[str], List[Dict[str, str]]], keyword: str) -> List[Dict[str, str]]:
+    start = time.perf_counter()
+    ok = True
+    try:
+        with tracing.span(f'search_{source}', keyword=keyword):
+            return func(keyword)
+    except Exception:
+        ok = False
+        raise
+    finally:
+        _record(source, time.perf_counter() - start, ok)
+
+def search_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-source call counts and latency percentiles (seconds) over recent searches"""
+    stats = {}
+    with _metrics_lock:
+        for source, samples in _latencies.items():
+            ordered = sorted(samples)
+            stats[source] = dict(
+                _outcomes[source],
+                p50=round(ordered[len(ordered) // 2], 3),
+                p95=round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                max=round(ordered[-1], 3)
+            )
+    return stats
+
+def normalize_keyword(keyword: str) -> str:
+    """Case, punctuation and spacing insensitive cache key for a keyword"""
+    return " ".join(re.sub(r'[^\w\s]', ' ', keyword.lower()).split())
+
+class SearchCache:
+    """LRU cache of search results per (source, normalized keyword).
+
+    Backed by an optional SQLite table so results survive restarts and are
+    shared between workers on the same host.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, db_path: str = SEARCH_CACHE_DB):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, float, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "source TEXT, keyword TEXT, value TEXT, created REAL, ok INTEGER, "
+                "PRIMARY KEY (source, keyword))"
+            )
+            self._db.commit()
+
+    def _count(self, source: str, outcome: str) -> None:
+        counters = self._counters.setdefault(source, {'hits': 0, 'stale_hits': 0, 'negative_hits': 0, 'misses': 0})
+        counters[outcome] += 1
+
+    def _load(self, key: Tuple[str, str]) -> Optional[Tuple[Any, float, bool]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT value, created, ok FROM search_cache WHERE source = ? AND keyword = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1], bool(row[2]))
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: Tuple[str, str], entry: Tuple[Any, float, bool]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, source: str, keyword: str) -> Tuple[str, Any]:
+        """Return (state, value) where state is fresh, stale, negative or miss"""
+        key = (source, normalize_keyword(keyword))
+        with self._lock:
+            entry = self._load(key)
+            if entry is None:
+                self._count(source, 'misses')
+                return 'miss', None
+
+            value, created, ok = entry
+            age = time.time() - created
+            ttl = SEARCH_CACHE_TTL.get(source, 3600)
+            if not ok:
+                state = 'negative' if age < SEARCH_CACHE_NEGATIVE_TTL else 'miss'
+            elif age < ttl:
+                state = 'fresh'
+            elif age < ttl + SEARCH_CACHE_STALE:
+                state = 'stale'
+            else:
+                state = 'miss'
+
+            self._count(source, {'fresh': 'hits', 'stale': 'stale_hits',
+                                 'negative': 'negative_hits', 'miss': 'misses'}[state])
+            return state, value
+
+    def store(self, source: str, keyword: str, value: Any, ok: bool = True) -> None:
+        key = (source, normalize_keyword(keyword))
+        entry = (value, time.time(), ok)
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?)",
+                        (key[0], key[1], json.dumps(value), entry[1], int(ok))
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Search cache write failed: {e}")
+
+    def start_refresh(self, source: str, keyword: str) -> bool:
+        """Claim the background refresh of a stale entry (False if already running)"""
+        key = (source, normalize_keyword(keyword))
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, source: str, keyword: str) -> None:
+        with self._lock:
+            self._refreshing.discard((source, normalize_keyword(keyword)))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            stats = {source: dict(c) for source, c in self._counters.items()}
+            size = len(self._entries)
+        for c in stats.values():
+            lookups = sum(c.values())
+            c['hit_ratio'] = round((c['hits'] + c['stale_hits'] + c['negative_hits']) / lookups, 3) if lookups else 0.0
+        return {'entries': size, 'sources': stats}
+
+search_cache = SearchCache()
+
 def clean_title(title: str) -> str:
     """Remove hashtags and clean whitespace from titles"""
     return re.sub(r'#\w+\s*', '', title).strip()
 
+class KeywordEngine:
+    """KeyBERT-style keyphrase extraction that scales to long transcripts.
+
+    The document is split into chunks that fit the embedding model's
+    max_seq_length, counted with its own tokenizer. Cheap
+    TF-IDF scoring over those chunks picks candidate 1-2 word phrases, and
+    only the top candidates are embedded, in batches. Each candidate is
+    scored by its similarity to the chunks it appears in, and the per-chunk
+    scores are merged by taking the best one. Embeddings of chunks and
+    phrases are kept in an LRU cache, so re-processing a document (or a
+    grown version of it) only embeds the new parts.
+    """
+
+    def __init__(self, candidates: int = KEYWORD_CANDIDATES, chunk_tokens: int = KEYWORD_CHUNK_TOKENS,
+                 batch_size: int = EMBED_BATCH_SIZE, cache_size: int = EMBEDDING_CACHE_SIZE,
+                 embedder: Any = None):
+        self.candidates = candidates
+        self.embedder = embedder  # KeyBERT embedding backend; None uses the shared model
+        self.chunk_tokens = chunk_tokens
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Unit-normalized embeddings, computing only what is not cached"""
+        keys = [hashlib.sha1(text.encode('utf-8')).hexdigest() for text in texts]
+        with self._lock:
+            missing = list(dict.fromkeys(
+                (key, text) for key, text in zip(keys, texts) if key not in self._cache
+            ))
+
+        if missing:
+            backend = self._backend()
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                vectors = np.asarray(backend.embed([text for _, text in batch]), dtype=np.float32)
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                with self._lock:
+                    for (key, _), vector in zip(batch, vectors):
+                        self._cache[key] = vector
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+        with self._lock:
+            vectors = []
+            for key in keys:
+                self._cache.move_to_end(key)
+                vectors.append(self._cache[key])
+        return np.vstack(vectors)
+
+    def _backend(self) -> Any:
+        return self.embedder or model_registry.get_model("keybert").model
+
+    def chunk(self, text: str) -> List[str]:
+        """Chunks the embedding model sees whole, counted with its own tokenizer"""
+        backend = self._backend()
+        model = getattr(backend, 'embedding_model', backend)  # KeyBERT wraps the SentenceTransformer
+        tokenizer = getattr(model, 'tokenizer', None)
+        budget = self.chunk_tokens
+        max_length = getattr(model, 'max_seq_length', None)
+        if max_length:
+            budget = min(budget, max_length - 2)  # [CLS] and [SEP]
+        if tokenizer is None:
+            # Word-ish pseudo tokens undercount WordPiece by roughly a third
+            budget = max(1, budget * 3 // 4)
+        return [chunk.text for chunk in chunker.chunk_text(text, tokenizer, budget)]
+
+    def candidate_phrases(self, chunks: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Top TF-IDF phrases and a (chunks x phrases) presence mask"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        vectorizer = TfidfVectorizer(ngram_range=(1, 2), stop_words='english')
+        tfidf = vectorizer.fit_transform(chunks)
+        scores = np.asarray(tfidf.sum(axis=0)).ravel()
+        top = np.argsort(-scores, kind='stable')[:self.candidates]
+        phrases = vectorizer.get_feature_names_out()[top].tolist()
+        return phrases, tfidf[:, top].toarray() > 0
+
+    def extract(self, text: str, top_n: int = 5) -> List[Tuple[str, float]]:
+        chunks = self.chunk(text)
+        if not chunks:
+            return []
+
+        phrases, present = self.candidate_phrases(chunks)
+        if not phrases:
+            return []
+
+        similarity = self.embed(chunks) @ self.embed(phrases).T  # chunks x phrases
+        merged = np.where(present, similarity, -1.0).max(axis=0)
+        best = np.argsort(-merged, kind='stable')[:top_n]
+        return [(phrases[i], round(float(merged[i]), 4)) for i in best if merged[i] > -1.0]
+
+    def document_embedding(self, text: str) -> Optional[np.ndarray]:
+        """Unit mean of the chunk embeddings (already cached after extract)"""
+        chunks = self.chunk(text)
+        if not chunks:
+            return None
+        vector = self.embed(chunks).mean(axis=0)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+keyword_engine = KeywordEngine()
+recommendation_index = vector_index.VectorIndex(signature=model_registry.keyword_signature())
+
 def extract_keywords(text: str) -> List[str]:
-    """Extract and display top keywords using KeyBERT"""
+    """Extract and display top keywords"""
     try:
-        print("\n🔍 Extracting keywords...")
-        kw_model = KeyBERT()
-        keywords = kw_model.extract_keywords(
-            text,
-            keyphrase_ngram_range=(1, 2),
-            stop_words='english',
-            top_n=5
-        )
-        extracted_keywords = [kw[0] for kw in keywords]
-        
-        # Display keywords in terminal
-        print("✅ Extracted Keywords:")
-        for idx, keyword in enumerate(extracted_keywords, 1):
-            print(f"   {idx}. {keyword}")
-            
+        with tracing.span('keyword') as fields:
+            keywords = keyword_engine.extract(text, top_n=5)
+            extracted_keywords = [kw[0] for kw in keywords]
+            fields['keywords'] = extracted_keywords
         return extracted_keywords
     except Exception as e:
         logger.error(f"Keyword extraction failed: {e}")
-        print("❌ Keyword extraction failed")
         return []
 
+def fetch_youtube(keyword: str) -> List[Dict[str, str]]:
+    """Query the YouTube Data API for tutorial videos (raises on failure)"""
+    response = session.get(
+        YOUTUBE_API_URL,
+        params={
+            'part': 'snippet',
+            'q': f"{keyword} tutorial",
+            'key': YOUTUBE_API_KEY,
+            'maxResults': 7,
+            'type': 'video',
+            'relevanceLanguage': 'en'
+        },
+        timeout=SEARCH_TIMEOUT
+    )
+    response.raise_for_status()
+    return [{
+        'title': clean_title(item['snippet']['title']),
+        'description': item['snippet'].get('description', ''),
+        'url': f"https://youtube.com/watch?v={item['id']['videoId']}",
+        'type': 'youtube'
+    } for item in response.json().get('items', []) if item['id'].get('videoId')]
+
+def fetch_wikipedia(keyword: str) -> List[Dict[str, str]]:
+    """Query the MediaWiki search API for articles (raises on failure)"""
+    response = session.get(
+        WIKIPEDIA_API_URL,
+        params={
+            'action': 'query',
+            'list': 'search',
+            'srsearch': keyword,
+            'srlimit': 7,
+            'srprop': 'snippet',
+            'format': 'json'
+        },
+        headers={'User-Agent': 'Lectura.AI study recommender'},
+        timeout=SEARCH_TIMEOUT
+    )
+    response.raise_for_status()
+    return [{
+        'title': result['title'],
+        'description': html.unescape(re.sub(r'<[^>]+>', '', result.get('snippet', ''))),
+        'url': f"https://en.wikipedia.org/wiki/{result['title'].replace(' ', '_')}",
+        'type': 'wikipedia'
+    } for result in response.json().get('query', {}).get('search', [])[:7]]
+
 def search_youtube(keyword: str) -> List[Dict[str, str]]:
-    """Search YouTube with progress indication"""
+    """Search YouTube, returning no results on failure"""
     if not YOUTUBE_API_KEY:
-        print("⚠️ YouTube API key missing - skipping YouTube search")
+        logger.warning("YouTube API key missing - skipping YouTube search")
         return []
-    
+    return _search('youtube', keyword)
+
+def search_wikipedia(keyword: str) -> List[Dict[str, str]]:
+    """Search Wikipedia, returning no results on failure"""
+    return _search('wikipedia', keyword)
+
+_FETCHERS = {'youtube': fetch_youtube, 'wikipedia': fetch_wikipedia}
+_LABELS = {'youtube': ('YouTube', 'videos'), 'wikipedia': ('Wikipedia', 'articles')}
+
+def _search(source: str, keyword: str) -> List[Dict[str, str]]:
+    state, cached = search_cache.lookup(source, keyword)
+    if state == 'fresh':
+        return cached
+    if state == 'negative':
+        return []
+    if state == 'stale':
+        if search_cache.start_refresh(source, keyword):
+            _search_pool.submit(tracing.bind(_refresh), source, keyword)
+        return cached
+    return _fetch_and_store(source, keyword)
+
+def _fetch_and_store(source: str, keyword: str) -> List[Dict[str, str]]:
+    name, noun = _LABELS[source]
     try:
-        print(f"   Searching YouTube for: '{keyword}'...", end="", flush=True)
-        response = requests.get(
-            "https://www.googleapis.com/youtube/v3/search",
-            params={
-                'part': 'snippet',
-                'q': f"{keyword} tutorial",
-                'key': YOUTUBE_API_KEY,
-                'maxResults': 7,
-                'type': 'video',
-                'relevanceLanguage': 'en'
-            },
-            timeout=15
-        )
-        results = [{
-            'title': clean_title(item['snippet']['title']),
-            'url': f"https://youtube.com/watch?v={item['id']['videoId']}",
-            'type': 'youtube'
-        } for item in response.json().get('items', []) if item['id'].get('videoId')]
-        
-        print(f" found {len(results)} videos")
+        results = _timed(source, _FETCHERS[source], keyword)
+        search_cache.store(source, keyword, results)
+        logger.info(f"{name} '{keyword}': found {len(results)} {noun}",
+                    extra={'source': source, 'keyword': keyword, 'results': len(results)})
         return results
-        
     except Exception as e:
-        logger.error(f"YouTube search failed: {e}")
-        print(f"❌ YouTube search failed for '{keyword}'")
+        search_cache.store(source, keyword, [], ok=False)
+        logger.error(f"{name} search failed for '{keyword}': {e}",
+                     extra={'source': source, 'keyword': keyword})
         return []
 
-def search_wikipedia(keyword: str) -> List[Dict[str, str]]:
-    """Search Wikipedia with progress indication"""
+def _refresh(source: str, keyword: str) -> None:
+    name = _LABELS[source][0]
     try:
-        print(f"   Searching Wikipedia for: '{keyword}'...", end="", flush=True)
-        results = [{
-            'title': result,
-            'url': f"https://en.wikipedia.org/wiki/{result.replace(' ', '_')}",
-            'type': 'wikipedia'
-        } for result in wikipedia.search(keyword)[:7]]
-        
-        print(f" found {len(results)} articles")
-        return results
-        
+        results = _timed(source, _FETCHERS[source], keyword)
+        search_cache.store(source, keyword, results)
     except Exception as e:
-        logger.error(f"Wikipedia search failed: {e}")
-        print(f"❌ Wikipedia search failed for '{keyword}'")
-        return []
+        # Keep serving the stale entry rather than poisoning it with a failure
+        logger.error(f"{name} background refresh failed: {e}")
+    finally:
+        search_cache.end_refresh(source, keyword)
 
 def get_khan_academy_links(keyword: str) -> List[Dict[str, str]]:
-    """Generate Khan Academy links with progress indication"""
-    print(f"   Generating Khan Academy links for: '{keyword}'...", end="", flush=True)
+    """Generate Khan Academy search links"""
     results = [{
         'title': f"{keyword} (Khan Academy)",
         'url': f"https://www.khanacademy.org/search?referer=%2F&page_search_query={keyword.replace(' ', '+')}",
         'type': 'khan_academy'
     } for _ in range(5)]
-    
-    print(f" generated {len(results)} links")
     return results
 
-def generate_recommendations(text: str) -> Dict[str, List[Dict[str, str]]]:
-    """Main function with enhanced progress tracking"""
-    print("\n🌟 Starting recommendation generation")
-    print("=================================")
-    
+def _item_text(item: Dict[str, str]) -> str:
+    return f"{item['title']}. {item.get('description', '')}".strip()
+
+def _document_vector(text: str) -> Optional[np.ndarray]:
+    try:
+        return keyword_engine.document_embedding(text)
+    except Exception as e:
+        logger.error(f"Document embedding failed: {e}")
+        return None
+
+def _rerank(items: List[Dict[str, str]], document: np.ndarray, index: bool = True) -> List[Dict[str, str]]:
+    """Order items by similarity to the document and collapse near-duplicates.
+
+    With index set, the items are added to the recommendation index on the way.
+    Falls back to the original order if embedding fails.
+    """
+    if not items:
+        return items
+    try:
+        vectors = keyword_engine.embed([_item_text(item) for item in items])
+        if index:
+            recommendation_index.add(items, vectors)
+    except Exception as e:
+        logger.error(f"Recommendation re-ranking failed: {e}")
+        return items
+
+    order = np.argsort(-(vectors @ document), kind='stable')
+    kept = vector_index.collapse_near_duplicates(vectors, order, DEDUP_THRESHOLD)
+    if len(kept) < len(items):
+        logger.info(f"Collapsed {len(items) - len(kept)} near-duplicate {items[0]['type']} results")
+    return [items[i] for i in kept]
+
+def _dedupe(items: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    seen = set()
+    return [x for x in items if not (x['url'] in seen or seen.add(x['url']))]
+
+def generate_recommendations(text: str, deadline: float = RECOMMENDATION_DEADLINE,
+                             on_category: Optional[Callable[[str, List[Dict[str, str]]], None]] = None
+                             ) -> Dict[str, List[Dict[str, str]]]:
+    """YouTube, Wikipedia and Khan Academy resources for the text's keywords.
+
+    on_category(category, items) is called as soon as each category is
+    final, so callers can show results while slower searches still run.
+    """
     keywords = extract_keywords(text)
     if not keywords:
-        print("⛔ No keywords extracted - cannot generate recommendations")
+        logger.warning("No keywords extracted - cannot generate recommendations")
         return {'youtube': [], 'wikipedia': [], 'khan_academy': []}
     
     recommendations = {
@@ -122,25 +498,69 @@ def generate_recommendations(text: str) -> Dict[str, List[Dict[str, str]]]:
         'wikipedia': [],
         'khan_academy': []
     }
-    
-    # Process each keyword
-    for keyword in keywords:
-        recommendations['youtube'].extend(search_youtube(keyword))
-        recommendations['wikipedia'].extend(search_wikipedia(keyword))
-        recommendations['khan_academy'].extend(get_khan_academy_links(keyword))
-    
-    # Remove duplicates
-    for category in recommendations:
-        seen = set()
-        recommendations[category] = [x for x in recommendations[category] 
-            if not (x['url'] in seen or seen.add(x['url']))]
-    
-    # Final summary
-    print("\n📊 Recommendation Results:")
-    print(f"   YouTube Videos: {len(recommendations['youtube'])}")
-    print(f"   Wikipedia Articles: {len(recommendations['wikipedia'])}")
-    print(f"   Khan Academy Links: {len(recommendations['khan_academy'])}")
-    print("=================================")
-    print("✅ Recommendation generation complete\n")
-    
-    return recommendations
\ No newline at end of file
+
+    def publish(category: str, items: List[Dict[str, str]]) -> None:
+        recommendations[category] = items
+        if on_category is not None:
+            on_category(category, items)
+
+    # Khan Academy links need no lookups
+    publish('khan_academy', _dedupe([link for keyword in keywords for link in get_khan_academy_links(keyword)]))
+
+    document = _document_vector(text)
+
+    # Sources the local index can already answer need no network calls
+    searches = {'youtube': search_youtube, 'wikipedia': search_wikipedia}
+    if document is not None:
+        for source in list(searches):
+            try:
+                hits = recommendation_index.search(document, INDEX_SERVE_RESULTS, item_type=source,
+                                                   min_score=INDEX_SERVE_THRESHOLD)
+            except Exception as e:
+                logger.error(f"Recommendation index search failed - searching online: {e}")
+                break
+            if len(hits) >= INDEX_SERVE_RESULTS:
+                logger.info(f"{_LABELS[source][0]}: serving {len(hits)} indexed {_LABELS[source][1]}")
+                publish(source, _rerank([item for item, _ in hits], document, index=False))
+                del searches[source]
+
+    # Fan out every network lookup at once and keep whatever finishes in time
+    futures = {
+        (source, index): _search_pool.submit(tracing.bind(func), keyword)
+        for index, keyword in enumerate(keywords)
+        for source, func in searches.items()
+    }
+    waiting = {source: {f for (s, _), f in futures.items() if s == source} for source in searches}
+
+    def finish(source: str) -> None:
+        # Assemble in keyword order so the strongest keywords come first
+        items = []
+        for index in range(len(keywords)):
+            future = futures[(source, index)]
+            if future.done() and not future.cancelled():
+                items.extend(future.result())
+        items = _dedupe(items)
+        publish(source, _rerank(items, document) if document is not None else items)
+
+    sources = {future: source for (source, _), future in futures.items()}
+    try:
+        for future in as_completed(sources, timeout=deadline):
+            source = sources[future]
+            waiting[source].discard(future)
+            if not waiting[source]:
+                finish(source)
+    except FuturesTimeout:
+        pending = [future for futures_left in waiting.values() for future in futures_left]
+        logger.warning(f"Deadline reached - returning partial results ({len(pending)} searches pending)")
+        with _metrics_lock:
+            for future in pending:
+                future.cancel()
+                _outcomes.setdefault(sources[future], {'ok': 0, 'errors': 0, 'timeouts': 0})['timeouts'] += 1
+        for source, futures_left in waiting.items():
+            if futures_left:
+                finish(source)
+
+    counts = {category: len(items) for category, items in recommendations.items()}
+    logger.info(f"Recommendations: {counts['youtube']} videos, {counts['wikipedia']} articles, "
+                f"{counts['khan_academy']} Khan Academy links", extra={'counts': counts})
+    return recommendations
@@ -0,0 +1,178 @@
+# tracing.py
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+import metrics
+
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json or text
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+# Sampling profiler: requests and job stages slower than PROFILE_SLOW_SECONDS
+# get their collapsed stacks written to PROFILE_DIR. 0 turns it off.
+PROFILE_SLOW_SECONDS = float(os.getenv('PROFILE_SLOW_SECONDS', '0'))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.01'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+logger = logging.getLogger(__name__)
+
+_trace_id: contextvars.ContextVar = contextvars.ContextVar('trace_id', default=None)
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'trace_id'}
+
+def current_trace() -> Optional[str]:
+    return _trace_id.get()
+
+def start_trace(trace_id: Optional[str] = None) -> contextvars.Token:
+    """Make trace_id (or a fresh one) current; pass the token to end_trace"""
+    return _trace_id.set(trace_id or uuid.uuid4().hex)
+
+def end_trace(token: contextvars.Token) -> None:
+    _trace_id.reset(token)
+
+@contextmanager
+def trace(trace_id: Optional[str] = None) -> Iterator[str]:
+    token = start_trace(trace_id)
+    try:
+        yield _trace_id.get()
+    finally:
+        end_trace(token)
+
+def bind(func: Callable) -> Callable:
+    """Wrap func so it runs under the caller's trace on a pool thread"""
+    trace_id = current_trace()
+
+    def run(*args, **kwargs):
+        with trace(trace_id):
+            return func(*args, **kwargs)
+    return run
+
+@contextmanager
+def span(name: str, **fields) -> Iterator[Dict[str, Any]]:
+    """Time a stage into the stage histogram and log it as one record.
+
+    The yielded dict can be filled with extra fields for the log record.
+    """
+    fields = dict(fields)
+    metrics.STAGE_INFLIGHT.inc(stage=name)
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield fields
+    except BaseException:
+        status = 'error'
+        metrics.STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.STAGE_INFLIGHT.dec(stage=name)
+        metrics.STAGE_SECONDS.observe(elapsed, stage=name)
+        logger.info(f"{name} {status} in {elapsed:.3f}s",
+                    extra=dict(fields, span=name, seconds=round(elapsed, 4), status=status))
+
+class TraceFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the trace id and any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'trace_id': getattr(record, 'trace_id', None),
+            'thread': record.threadName
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(fmt: str = LOG_FORMAT, level: str = LOG_LEVEL) -> None:
+    """Send all logging to stderr as JSON lines (or plain text)"""
+    handler = logging.StreamHandler(sys.stderr)
+    handler.addFilter(TraceFilter())
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s'))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every interval seconds.
+
+    Stacks are counted in the collapsed format used by flamegraph tools
+    (frames joined by ';'), which is cheap enough to leave on for slow
+    request diagnosis.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True, name='profiler')
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self) -> 'SamplingProfiler':
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+def start_profiler() -> Optional[SamplingProfiler]:
+    """A running profiler for the current thread, or None when profiling is off"""
+    if PROFILE_SLOW_SECONDS <= 0:
+        return None
+    return SamplingProfiler().start()
+
+def stop_profiler(profiler: Optional[SamplingProfiler], name: str, elapsed: float) -> Optional[str]:
+    """Stop profiler and dump its stacks if elapsed was slow; returns the dump path"""
+    if profiler is None:
+        return None
+    samples = profiler.stop()
+    if elapsed < PROFILE_SLOW_SECONDS or not samples:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+    path = os.path.join(PROFILE_DIR, f"{int(time.time())}-{safe_name}-{current_trace() or 'none'}.folded")
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    logger.warning(f"Slow {name} took {elapsed:.2f}s - profile written to {path}",
+                   extra={'profile': path, 'seconds': round(elapsed, 4)})
+    return path
+
+@contextmanager
+def profiled(name: str) -> Iterator[None]:
+    profiler = start_profiler()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stop_profiler(profiler, name, time.perf_counter() - start)
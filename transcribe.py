@@ -3,53 +3,286 @@ import os
 import subprocess
 import tempfile
 import shutil
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
+import tracing
 
 load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Number of worker processes for CPU-heavy formats; 0 extracts in-process
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '0'))
+CPU_HEAVY_EXTENSIONS = {'.mp3', '.mp4', '.wav', '.pdf'}
+
+# "whole" hands the full recording to Whisper in one call; "chunked" splits
+# it on silences and decodes the segments in parallel worker processes
+TRANSCRIBE_MODE = os.getenv('TRANSCRIBE_MODE', 'whole')
+TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', '2'))
+SEGMENT_SECONDS = float(os.getenv('SEGMENT_SECONDS', '120'))
+SILENCE_SEARCH_SECONDS = 10.0
+SAMPLE_RATE = 16000
+# Decoded audio beyond this length is memory-mapped from a temp file instead of held in RAM
+AUDIO_MEMMAP_SECONDS = float(os.getenv('AUDIO_MEMMAP_SECONDS', '7200'))
+DOCUMENT_EXTENSIONS = {'.pdf', '.docx', '.txt'}
+
+# PDFs with at least this many pages are extracted in parallel page ranges
+PDF_PARALLEL_PAGES = int(os.getenv('PDF_PARALLEL_PAGES', '100'))
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', '2'))
+PDF_RANGE_PAGES = 25
+
+_pool = None
+_segment_pool = None
+_pdf_pool = None
 
 def check_ffmpeg():
     """Check if ffmpeg is available in the system path"""
     if shutil.which("ffmpeg") is None:
         raise Exception("ffmpeg is not installed or not found in PATH. Please install ffmpeg and try again.")
 
-def convert_to_wav(input_path, temp_dir):
-    """Convert media file to WAV format using FFmpeg"""
-    output_path = os.path.join(temp_dir, "converted_audio.wav")
-    
+def transcribe_audio(file_path):
+    """Transcribe audio using Whisper"""
+    import model_registry
+    model = model_registry.get_model("whisper")
+    result = model.transcribe(load_audio(file_path))
+    return result["text"]
+
+def load_audio(file_path, sample_rate=SAMPLE_RATE):
+    """Decode any audio/video file to mono float32 samples via an FFmpeg pipe.
+
+    FFmpeg writes raw PCM to stdout, which is read straight into memory -
+    no intermediate WAV on disk, and Whisper gets the array without
+    decoding the file again. Recordings longer than AUDIO_MEMMAP_SECONDS
+    are spooled to a temporary file and memory-mapped instead.
+    """
+    import numpy as np
+    check_ffmpeg()
     command = [
         "ffmpeg",
-        "-i", input_path,
-        "-ar", "16000",  # Set audio sample rate to 16kHz
-        "-ac", "1",      # Set audio channels to mono
-        "-y",            # Overwrite output file without asking
-        output_path
+        "-nostdin",
+        "-i", file_path,
+        "-f", "f32le",
+        "-acodec", "pcm_f32le",
+        "-ac", "1",                # Mono
+        "-ar", str(sample_rate),   # 16kHz for Whisper
+        "-"
     ]
-    
+
+    spill_bytes = int(AUDIO_MEMMAP_SECONDS * sample_rate * 4)
+    buffer = bytearray()
+    spool = None
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            while True:
+                block = process.stdout.read(1024 * 1024)
+                if not block:
+                    break
+                if spool is None and len(buffer) + len(block) > spill_bytes:
+                    spool = tempfile.NamedTemporaryFile(suffix='.f32', delete=False)
+                    spool.write(buffer)
+                    buffer = bytearray()
+                if spool is not None:
+                    spool.write(block)
+                else:
+                    buffer.extend(block)
+        finally:
+            process.stdout.close()
+            process.wait()
+            if spool is not None:
+                spool.close()
+
+        if process.returncode != 0:
+            stderr.seek(0)
+            if spool is not None:
+                os.unlink(spool.name)
+            raise Exception(f"FFmpeg decoding failed: {stderr.read().decode(errors='replace')}")
+
+    if spool is not None:
+        size = os.path.getsize(spool.name) // 4
+        if size == 0:
+            os.unlink(spool.name)
+            raise Exception("No audio found in file")
+        # Copy-on-write mapping: writable for torch, but never touches the file
+        audio = np.memmap(spool.name, dtype=np.float32, mode='c', shape=(size,))
+        try:
+            os.unlink(spool.name)  # The mapping stays valid until it is released (POSIX)
+        except OSError:
+            pass
+        return audio
+
+    del buffer[len(buffer) // 4 * 4:]
+    if not buffer:
+        raise Exception("No audio found in file")
+    return np.frombuffer(buffer, dtype=np.float32)
+
+def split_on_silence(audio, sample_rate=SAMPLE_RATE, target_seconds=SEGMENT_SECONDS,
+                     search_seconds=SILENCE_SEARCH_SECONDS):
+    """(start, end) sample ranges of roughly target_seconds each.
+
+    Each cut is moved to the quietest 30 ms frame within search_seconds of
+    the target position, so words are not split across segments.
+    """
+    import numpy as np
+    frame = int(sample_rate * 0.03)
+    n_frames = len(audio) // frame
+    if n_frames == 0 or len(audio) <= target_seconds * sample_rate * 1.5:
+        return [(0, len(audio))]
+
+    energy = np.sqrt(np.mean(np.square(audio[:n_frames * frame].reshape(n_frames, frame)), axis=1))
+    step = int(target_seconds * sample_rate / frame)
+    search = int(search_seconds * sample_rate / frame)
+
+    cuts = [0]
+    position = step
+    while position < n_frames - step // 2:
+        low = max(cuts[-1] + 1, position - search)
+        high = min(n_frames, position + search)
+        cut = low + int(np.argmin(energy[low:high]))
+        cuts.append(cut)
+        position = cut + step
+
+    bounds = [cut * frame for cut in cuts] + [len(audio)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _init_segment_worker(threads):
+    # Split the cores between workers instead of every worker grabbing all of them
     try:
-        subprocess.run(command, check=True, capture_output=True)
-    except subprocess.CalledProcessError as e:
-        error_message = f"FFmpeg conversion failed: {e.stderr.decode()}"
-        raise Exception(error_message)
-    
-    return output_path
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
 
-def transcribe_audio(file_path):
-    """Transcribe audio using Whisper"""
-    import whisper
-    model = whisper.load_model("base")
-    result = model.transcribe(file_path)
-    return result["text"]
+def get_segment_pool():
+    """Process pool for decoding audio segments (None when TRANSCRIBE_WORKERS < 2)"""
+    global _segment_pool
+    if TRANSCRIBE_WORKERS < 2:
+        return None
+    if _segment_pool is None:
+        threads = max(1, (os.cpu_count() or 1) // TRANSCRIBE_WORKERS)
+        _segment_pool = ProcessPoolExecutor(
+            max_workers=TRANSCRIBE_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_segment_worker,
+            initargs=(threads,)
+        )
+    return _segment_pool
+
+def _decode_segment(segment, offset):
+    """Transcribe one segment; timestamps are shifted to the full recording"""
+    import model_registry
+    model = model_registry.get_model("whisper")
+    result = model.transcribe(segment, fp16=False)
+    segments = result.get("segments") or []
+    if not segments:
+        return [(offset, offset + len(segment) / SAMPLE_RATE, result["text"].strip())]
+    return [(offset + seg["start"], offset + seg["end"], seg["text"].strip()) for seg in segments]
+
+def transcribe_segments(file_path):
+    """Yield (start_seconds, end_seconds, text) in order as the audio is decoded.
+
+    Segments are decoded in parallel, and each is yielded as soon as it and
+    everything before it has finished, so callers can start working on the
+    beginning of a lecture while the rest is still being transcribed.
+    """
+    audio = load_audio(file_path)
+    spans = split_on_silence(audio)
+    pool = get_segment_pool()
+
+    if pool is None or len(spans) == 1:
+        for start, end in spans:
+            yield from _decode_segment(audio[start:end], start / SAMPLE_RATE)
+        return
+
+    futures = [pool.submit(_decode_segment, audio[start:end], start / SAMPLE_RATE) for start, end in spans]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+def transcribe_audio_chunked(file_path):
+    """Transcribe audio as silence-aligned segments decoded in parallel"""
+    return " ".join(text for _, _, text in transcribe_segments(file_path) if text)
+
+def stream_text(file_path):
+    """Yield an upload's text piece by piece (PDF pages, audio segments)
+    as it is extracted; other formats arrive as one piece"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.pdf':
+        try:
+            yield from iter_pdf_pages(file_path)
+        except Exception as e:
+            raise Exception(f"PDF processing failed: {str(e)}")
+    elif streams_segments(file_path):
+        for _, _, text in transcribe_segments(file_path):
+            yield text
+    else:
+        yield extract_text(file_path)
+
+def streams_segments(file_path):
+    """Whether extraction of this file can be consumed segment by segment"""
+    ext = os.path.splitext(file_path)[1].lower()
+    return TRANSCRIBE_MODE == 'chunked' and ext not in DOCUMENT_EXTENSIONS
+
+def get_pdf_pool():
+    """Process pool for PDF page ranges (None when PDF_WORKERS < 2)"""
+    global _pdf_pool
+    if PDF_WORKERS < 2:
+        return None
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _pdf_pool
+
+def _extract_pdf_range(file_path, start, end):
+    """Text of pages [start, end) - runs in a worker process with its own reader"""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+def iter_pdf_pages(file_path):
+    """Yield the text of each PDF page in order.
+
+    Large documents are split into page ranges extracted by worker
+    processes; pages are still yielded in order as soon as they are ready,
+    so callers can start on the first chapter while the rest is parsed.
+    """
+    import PyPDF2
+    start_time = time.perf_counter()
+    reader = PyPDF2.PdfReader(file_path)
+    page_count = len(reader.pages)
+
+    pool = get_pdf_pool() if page_count >= PDF_PARALLEL_PAGES else None
+    if pool is None:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+    else:
+        futures = [
+            pool.submit(_extract_pdf_range, file_path, start, min(start + PDF_RANGE_PAGES, page_count))
+            for start in range(0, page_count, PDF_RANGE_PAGES)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    elapsed = time.perf_counter() - start_time
+    if elapsed > 0:
+        logger.info(f"Extracted {page_count} PDF pages at {page_count / elapsed:.1f} pages/s",
+                    extra={'pages': page_count, 'seconds': round(elapsed, 4)})
 
 def extract_text_pdf(file_path):
     """Extract text from PDF files"""
     try:
-        import PyPDF2
-        text = ""
-        with open(file_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-        return text.strip()
+        return "\n".join(iter_pdf_pages(file_path)).strip()
     except Exception as e:
         raise Exception(f"PDF processing failed: {str(e)}")
 
@@ -70,31 +303,54 @@ def extract_text_txt(file_path):
     except Exception as e:
         raise Exception(f"TXT processing failed: {str(e)}")
 
+def transcribe_file(file_path):
+    """Transcribe any audio/video file FFmpeg can decode"""
+    with tracing.span('transcribe', mode=TRANSCRIBE_MODE):
+        if TRANSCRIBE_MODE == 'chunked':
+            return transcribe_audio_chunked(file_path)
+        return transcribe_audio(file_path)
+
+# Extension -> extractor; anything not listed is decoded with FFmpeg for Whisper
+EXTRACTORS = {
+    '.pdf': extract_text_pdf,
+    '.docx': extract_text_docx,
+    '.txt': extract_text_txt,
+    '.mp3': transcribe_file,
+    '.mp4': transcribe_file,
+    '.wav': transcribe_file,
+}
+
+def get_process_pool():
+    """Bounded process pool for CPU-heavy extraction (None when disabled)"""
+    global _pool
+    if EXTRACTION_WORKERS <= 0:
+        return None
+    if _pool is None:
+        # spawn, not fork: forking a process that already holds torch threads can deadlock
+        _pool = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _pool
+
+def extract_text(file_path):
+    """Extract text from any supported upload without leaving the process
+    (unless EXTRACTION_WORKERS routes heavy formats to the process pool)"""
+    ext = os.path.splitext(file_path)[1].lower()
+    extractor = EXTRACTORS.get(ext, transcribe_file)
+
+    pool = get_process_pool() if ext in CPU_HEAVY_EXTENSIONS else None
+    if pool is not None:
+        return pool.submit(extractor, file_path).result()
+    return extractor(file_path)
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Error: Provide file path", file=sys.stderr)
         sys.exit(1)
 
-    file_path = sys.argv[1]
-    ext = os.path.splitext(file_path)[1].lower()
-
     try:
-        if ext == '.pdf':
-            print(extract_text_pdf(file_path))
-        elif ext == '.docx':
-            print(extract_text_docx(file_path))
-        elif ext == '.txt':
-            print(extract_text_txt(file_path))
-        elif ext in ('.mp3', '.mp4'):
-            check_ffmpeg()
-            temp_dir = tempfile.mkdtemp()
-            try:
-                wav_path = convert_to_wav(file_path, temp_dir)
-                print(transcribe_audio(wav_path))
-            finally:
-                shutil.rmtree(temp_dir)
-        else:
-            print(transcribe_audio(file_path))
+        print(extract_text(sys.argv[1]))
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
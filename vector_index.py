@@ -0,0 +1,230 @@
+# vector_index.py
+import os
+import time
+import uuid
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', os.path.join('cache', 'vector_index'))
+VECTOR_INDEX_MAX_ITEMS = int(os.getenv('VECTOR_INDEX_MAX_ITEMS', '100000'))
+# Shards are merged into one once there are more than this many
+VECTOR_INDEX_MAX_SHARDS = int(os.getenv('VECTOR_INDEX_MAX_SHARDS', '64'))
+# A compaction lock older than this was left behind by a crashed worker
+COMPACT_LOCK_TIMEOUT = 300
+
+logger = logging.getLogger(__name__)
+
+def _shard_name(created_ns: int) -> str:
+    # Zero-padded so that name order is creation order
+    return f"shard-{created_ns:020d}-{uuid.uuid4().hex}.npz"
+
+class VectorIndex:
+    """Flat inner-product index of unit vectors, persisted to disk.
+
+    Items are dicts identified by their 'url'; adding a known URL replaces
+    its vector. Every add() writes one small append-only shard, so workers
+    never rewrite each other's data; a worker only loads the shards it has
+    not seen yet. Once there are too many shards, whichever worker holds the
+    compaction lock merges them into one.
+
+    Vectors from different embedding models are not comparable, so each
+    signature (model@backend) gets its own subdirectory.
+    """
+
+    def __init__(self, directory: str = VECTOR_INDEX_DIR, max_items: int = VECTOR_INDEX_MAX_ITEMS,
+                 max_shards: int = VECTOR_INDEX_MAX_SHARDS, signature: Optional[str] = None):
+        if signature:
+            safe_name = ''.join(c if c.isalnum() or c in '-_.@' else '_' for c in signature)
+            directory = os.path.join(directory, safe_name)
+        self.directory = directory
+        self.max_items = max_items
+        self.max_shards = max_shards
+        self._reset()
+        self._lock = threading.Lock()
+
+    def _reset(self) -> None:
+        self._buffer: Optional[np.ndarray] = None  # Grows by doubling; rows past _count are unused
+        self._count = 0
+        self._items: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._shards: List[str] = []
+        self._dir_mtime: Optional[int] = None
+
+    @property
+    def _vectors(self) -> Optional[np.ndarray]:
+        return None if self._buffer is None else self._buffer[:self._count]
+
+    def _list_shards(self) -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(self.directory)
+                          if name.startswith('shard-') and name.endswith('.npz'))
+        except OSError:
+            return []
+
+    def _read_shard(self, name: str) -> Optional[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        try:
+            with np.load(os.path.join(self.directory, name)) as shard:
+                items = json.loads(str(shard['items']))
+                vectors = shard['vectors']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Skipping unreadable index shard {name}: {e}")
+            return None
+        if len(items) != len(vectors) or vectors.ndim != 2:
+            return None
+        if self._buffer is not None and vectors.shape[1] != self._buffer.shape[1]:
+            logger.warning(f"Skipping index shard {name}: {vectors.shape[1]}-d vectors, "
+                           f"index has {self._buffer.shape[1]}")
+            return None
+        return items, vectors
+
+    def _write_shard(self, items: List[Dict[str, Any]], vectors: np.ndarray, name: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = os.path.join(self.directory, f".{name}.tmp")
+        with open(temp_path, 'wb') as f:
+            np.savez(f, vectors=vectors.astype(np.float32), items=np.array(json.dumps(items)))
+        os.replace(temp_path, os.path.join(self.directory, name))
+
+    def _apply(self, items: List[Dict[str, Any]], vectors: np.ndarray) -> None:
+        """Merge items into memory; a known URL is updated in place"""
+        new_items, new_vectors = [], []
+        for item, vector in zip(items, vectors):
+            position = self._positions.get(item['url'])
+            if position is not None:
+                self._items[position] = item
+                self._buffer[position] = vector
+            else:
+                self._positions[item['url']] = self._count + len(new_items)
+                new_items.append(item)
+                new_vectors.append(vector)
+        if not new_items:
+            return
+
+        needed = self._count + len(new_items)
+        if self._buffer is None or needed > len(self._buffer):
+            grown = np.empty((max(needed, 2 * self._count, 1024), len(new_vectors[0])), dtype=np.float32)
+            if self._buffer is not None:
+                grown[:self._count] = self._buffer[:self._count]
+            self._buffer = grown
+        self._buffer[self._count:needed] = np.vstack(new_vectors)
+        self._items.extend(new_items)
+        self._count = needed
+
+        if self._count > self.max_items:
+            # Oldest entries go first
+            drop = self._count - self.max_items
+            self._buffer[:self.max_items] = self._buffer[drop:self._count]
+            self._items = self._items[drop:]
+            self._count = self.max_items
+            self._positions = {item['url']: i for i, item in enumerate(self._items)}
+
+    def _refresh(self) -> None:
+        """Load shards written since the last refresh"""
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._dir_mtime and time.time_ns() - mtime > 1_000_000_000:
+            # Nothing added or removed (recent mtimes are rechecked: they are coarse)
+            return
+        names = self._list_shards()
+        present = set(names)
+        if any(name not in present for name in self._shards):
+            # Another worker compacted the shards we had loaded
+            self._reset()
+        self._dir_mtime = mtime
+        loaded = set(self._shards)
+        for name in names:
+            if name in loaded:
+                continue
+            shard = self._read_shard(name)
+            if shard is not None:
+                self._apply(*shard)
+            self._shards.append(name)
+
+    def _compact(self) -> None:
+        """Merge every loaded shard into one, unless another worker is already at it"""
+        lock_path = os.path.join(self.directory, 'compact.lock')
+        try:
+            if time.time() - os.path.getmtime(lock_path) > COMPACT_LOCK_TIMEOUT:
+                os.unlink(lock_path)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except OSError:
+            return
+        try:
+            self._refresh()
+            merged = self._shards
+            if len(merged) <= 1 or not self._count:
+                return
+            # Named after the newest merged shard so it sorts before any newer ones
+            created_ns = int(max(merged).split('-')[1])
+            name = _shard_name(created_ns)
+            self._write_shard(self._items, self._vectors, name)
+            for old in merged:
+                try:
+                    os.unlink(os.path.join(self.directory, old))
+                except OSError:
+                    pass
+            self._shards = [name]
+            self._dir_mtime = None
+        except OSError as e:
+            logger.warning(f"Vector index compaction failed: {e}")
+        finally:
+            try:
+                os.unlink(lock_path)
+            except OSError:
+                pass
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, items: List[Dict[str, Any]], vectors: np.ndarray) -> None:
+        if not items:
+            return
+        unique = {item['url']: (item, vector) for item, vector in zip(items, vectors)}
+        items = [item for item, _ in unique.values()]
+        vectors = np.vstack([vector for _, vector in unique.values()]).astype(np.float32)
+        with self._lock:
+            self._refresh()
+            if self._buffer is not None and vectors.shape[1] != self._buffer.shape[1]:
+                logger.warning(f"Not indexing {vectors.shape[1]}-d vectors into a "
+                               f"{self._buffer.shape[1]}-d index at {self.directory}")
+                return
+            name = _shard_name(time.time_ns())
+            self._write_shard(items, vectors, name)
+            self._apply(items, vectors)
+            self._shards.append(name)
+            if len(self._shards) > self.max_shards:
+                self._compact()
+
+    def search(self, query: np.ndarray, k: int, item_type: Optional[str] = None,
+               min_score: float = -1.0) -> List[Tuple[Dict[str, Any], float]]:
+        """Top k items by cosine similarity to a unit query vector"""
+        with self._lock:
+            self._refresh()
+            if not self._count or query.shape[-1] != self._buffer.shape[1]:
+                return []
+            scores = self._vectors @ query
+            if item_type is not None:
+                mask = np.fromiter((item.get('type') == item_type for item in self._items),
+                                   dtype=bool, count=self._count)
+                scores = np.where(mask, scores, -np.inf)
+            top = np.argsort(-scores, kind='stable')[:k]
+            return [(self._items[i], float(scores[i])) for i in top if scores[i] >= min_score]
+
+def collapse_near_duplicates(vectors: np.ndarray, order: np.ndarray, threshold: float) -> List[int]:
+    """Indices from order (best first) with near-duplicates of better items removed"""
+    similarity = vectors @ vectors.T
+    suppressed = np.zeros(len(vectors), dtype=bool)
+    kept = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        kept.append(int(i))
+        suppressed |= similarity[i] >= threshold
+    return kept
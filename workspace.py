@@ -0,0 +1,105 @@
+# workspace.py
+import os
+import re
+import time
+import shutil
+import hashlib
+import tempfile
+from typing import Optional
+
+WORKSPACE_TTL = int(os.getenv('WORKSPACE_TTL', '3600'))  # seconds since last use
+INCOMING_DIR = '.incoming'
+_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+def hash_file(path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def incoming_path(root: str, filename: str) -> str:
+    """Unique temporary path for an upload that has not been hashed yet"""
+    incoming = os.path.join(root, INCOMING_DIR)
+    os.makedirs(incoming, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='upload-', suffix=f'-{filename}', dir=incoming)
+    os.close(fd)
+    return path
+
+def adopt_upload(root: str, temp_path: str, filename: str, key: Optional[str] = None) -> str:
+    """Move a saved upload into its content-addressed workspace.
+
+    Returns the path of the file inside the workspace. Identical uploads
+    share a workspace, so the duplicate copy is simply dropped.
+    """
+    key = key or hash_file(temp_path)
+    path = create_workspace(root, key)
+    ext = os.path.splitext(filename)[1].lower()
+    target = os.path.join(path, f'source{ext}')
+    if os.path.exists(target):
+        os.unlink(temp_path)
+    else:
+        os.replace(temp_path, target)
+    return target
+
+def create_workspace(root: str, key: str) -> str:
+    if not _KEY_PATTERN.match(key):
+        raise ValueError(f"Invalid workspace key: {key}")
+    path = os.path.join(root, key)
+    os.makedirs(path, exist_ok=True)
+    touch(path)
+    return path
+
+def get_workspace(root: str, key: str) -> Optional[str]:
+    """Path of an existing workspace, or None for unknown/invalid keys"""
+    if not key or not _KEY_PATTERN.match(key):
+        return None
+    path = os.path.join(root, key)
+    if not os.path.isdir(path):
+        return None
+    touch(path)
+    return path
+
+def workspace_key(path: str) -> str:
+    return os.path.basename(os.path.normpath(path))
+
+def touch(path: str) -> None:
+    """Mark a workspace as recently used so eviction leaves it alone"""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+def write_atomic(path: str, content: str) -> None:
+    """Write text so concurrent readers never see a half-written file"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+def evict_expired(root: str, ttl: int = WORKSPACE_TTL, keep=()) -> int:
+    """Remove workspaces (and stale incoming files) unused for ttl seconds.
+
+    Keys in keep (e.g. workspaces of jobs still running) are never removed.
+    """
+    if not os.path.isdir(root):
+        return 0
+
+    cutoff = time.time() - ttl
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if name == INCOMING_DIR:
+                for incoming in os.listdir(path):
+                    incoming = os.path.join(path, incoming)
+                    if os.path.getmtime(incoming) < cutoff:
+                        os.unlink(incoming)
+            elif _KEY_PATTERN.match(name) and name not in keep and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path)
+                removed += 1
+        except OSError:
+            # Removed by another worker in the meantime
+            continue
+    return removed